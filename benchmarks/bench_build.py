@@ -0,0 +1,301 @@
+"""
+离线构建基准：用本地 HTTP 服务代替 ddgksf2013.top / raw.githubusercontent.com / kelee.one 等上游，
+在临时目录里完整运行 src/main.py，统计构建耗时 (p50 / p95) 和传输字节数。
+
+- 上游文件来自仓库已提交的 Origin_Quantumultx.conf、rules/filter_remote/、rules/rewrite_remote/，
+  底包和 config.yaml 中的远程链接按文件名改写到本地服务，本地没有的文件返回 404；
+- 可设置延迟、带宽、错误率 (503，触发客户端重试)，支持 ETag / Last-Modified 条件请求 (304)；
+- --scales 追加 N 个合成规则列表 (每个 --rules-per-list 条)，模拟更大的配置；
+- cold: 每次使用全新目录 (全部完整下载)；warm: 在同一目录再构建一次 (条件请求 + 增量构建)。
+
+用法:
+    python benchmarks/bench_build.py [--runs 5] [--scales 0,20,100] [--latency-ms 20] [--bandwidth-kbps 0]
+                                     [--error-rate 0] [--no-304] [--json result.json]
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+URL_PATTERN = re.compile(r'^(https?://[^,\s]+)', re.M)
+
+
+def url_file_name(url):
+    return url.split('/')[-1].split('?')[0].split('#')[0] or "unknown.txt"
+
+
+class Upstream:
+    """模拟的上游服务: {文件名: 内容}，以及本轮的请求统计"""
+
+    def __init__(self, files, latency=0.0, bandwidth=0, error_rate=0.0, conditional=True, seed=0):
+        self.files = files
+        self.etags = {name: '"%s"' % hashlib.sha1(data).hexdigest() for name, data in files.items()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.conditional = conditional
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {"requests": 0, "bytes_sent": 0, "not_modified": 0, "errors": 0, "not_found": 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def fail(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+def make_handler(upstream):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            upstream.count("requests")
+            if upstream.latency:
+                time.sleep(upstream.latency)
+            name = self.path.split("?")[0].rsplit("/", 1)[-1]
+            data = upstream.files.get(name)
+
+            if upstream.fail():
+                upstream.count("errors")
+                return self.reply(503)
+            if data is None:
+                upstream.count("not_found")
+                return self.reply(404)
+
+            etag = upstream.etags[name]
+            if upstream.conditional and (self.headers.get("If-None-Match") == etag
+                                         or self.headers.get("If-Modified-Since") == LAST_MODIFIED):
+                upstream.count("not_modified")
+                return self.reply(304, headers={"ETag": etag, "Last-Modified": LAST_MODIFIED})
+
+            headers = {"ETag": etag, "Last-Modified": LAST_MODIFIED} if upstream.conditional else {}
+            self.reply(200, data, headers)
+
+        def reply(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not body:
+                return
+            if not upstream.bandwidth:
+                self.wfile.write(body)
+            else:
+                # 按带宽限速分块发送
+                step = 16 * 1024
+                for i in range(0, len(body), step):
+                    chunk = body[i:i + step]
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / upstream.bandwidth)
+            upstream.count("bytes_sent", len(body))
+
+    return Handler
+
+
+def load_upstream_files():
+    files = {}
+    for sec in ("filter_remote", "rewrite_remote"):
+        sec_dir = os.path.join(ROOT, "rules", sec)
+        for name in sorted(os.listdir(sec_dir)):
+            with open(os.path.join(sec_dir, name), 'rb') as f:
+                files[name] = f.read()
+    return files
+
+
+def synthetic_list(index, rules):
+    lines = [f"# synthetic list {index}"]
+    for i in range(rules):
+        kind = i % 3
+        if kind == 0:
+            lines.append(f"host-suffix,s{index}-{i}.example.com")
+        elif kind == 1:
+            lines.append(f"host,api{i}.s{index}.example.net")
+        else:
+            lines.append(f"ip-cidr,10.{index % 256}.{i // 256 % 256}.{i % 256}/32,no-resolve")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def local_url(server, url):
+    return f"{server}/upstream/{url_file_name(url)}"
+
+
+def prepare_workdir(workdir, server, scale):
+    """复制构建器代码和本地规则，生成指向本地服务的 config.yaml"""
+    shutil.copytree(os.path.join(ROOT, "src"), os.path.join(workdir, "src"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    os.makedirs(os.path.join(workdir, "rules"))
+    os.makedirs(os.path.join(workdir, "profiles"))
+    for name in os.listdir(os.path.join(ROOT, "rules")):
+        path = os.path.join(ROOT, "rules", name)
+        if os.path.isfile(path) and not name.endswith(".json"):
+            shutil.copy(path, os.path.join(workdir, "rules", name))
+
+    with open(os.path.join(ROOT, "profiles", "config.yaml"), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    config["base"] = {"url": f"{server}/upstream/QuantumultX.conf"}
+    build = dict(config.get("build") or {})
+    # 所有上游都在同一个本地地址，放开按域名限速，测量构建器本身
+    build["host_rate"] = 1000
+    build["host_burst"] = 1000
+    config["build"] = build
+
+    remote = []
+    for item in config.get("filter_remote") or []:
+        item = dict(item)
+        if item.get("source") == "blackmatrix7":
+            item["url"] = f"{server}/upstream/{item.pop('name')}.list"
+            item.pop("source")
+        elif item.get("url"):
+            item["url"] = local_url(server, item["url"])
+        remote.append(item)
+    for i in range(scale):
+        remote.append({"url": f"{server}/upstream/synthetic-{i}.list", "tag": f"Synthetic-{i}", "policy": "us-node"})
+    config["filter_remote"] = remote
+
+    config["rewrite_remote"] = [URL_PATTERN.sub(lambda m: local_url(server, m.group(1)), line)
+                                for line in config.get("rewrite_remote") or []]
+
+    with open(os.path.join(workdir, "profiles", "config.yaml"), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+
+
+def run_build(workdir, server):
+    env = dict(os.environ)
+    env.update({
+        "URL_RAW_PREFIX": f"{server}/mirror/rules",
+        "TELEGRAM_BOT_TOKEN": "",
+        "TELEGRAM_CHAT_ID": "",
+    })
+    env.pop("QX_CPROFILE", None)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(workdir, "src", "main.py")],
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise RuntimeError(f"构建失败，退出码 {proc.returncode}")
+    report_path = os.path.join(workdir, "build_report.json")
+    report = {}
+    if os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    return elapsed, report
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[int(round((len(ordered) - 1) * q))]
+
+
+def summarize(samples):
+    times = [s["seconds"] for s in samples]
+    result = {
+        "p50_s": round(percentile(times, 0.5), 3),
+        "p95_s": round(percentile(times, 0.95), 3),
+        "bytes_sent": int(percentile([s["upstream"]["bytes_sent"] for s in samples], 0.5)),
+        "requests": int(percentile([s["upstream"]["requests"] for s in samples], 0.5)),
+        "not_modified": int(percentile([s["upstream"]["not_modified"] for s in samples], 0.5)),
+        "errors": int(percentile([s["upstream"]["errors"] for s in samples], 0.5)),
+    }
+    stages = {}
+    for s in samples:
+        for stage in s["report"].get("stages", []):
+            stages.setdefault(stage["stage"], []).append(stage["wall_ms"])
+    result["stage_p50_ms"] = {name: percentile(values, 0.5) for name, values in stages.items()}
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线构建基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种规模、每种模式的构建次数")
+    parser.add_argument("--scales", default="0,20,100", help="追加的合成规则列表数量，逗号分隔")
+    parser.add_argument("--rules-per-list", type=int, default=2000, help="每个合成列表的规则数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="每个请求的固定延迟")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="单连接带宽 (KB/s)，0 为不限速")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 503 的概率")
+    parser.add_argument("--no-304", action="store_true", help="上游不支持条件请求")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+
+    files = load_upstream_files()
+    with open(os.path.join(ROOT, "Origin_Quantumultx.conf"), 'r', encoding='utf-8') as f:
+        origin = f.read()
+    for i in range(max(scales or [0])):
+        files[f"synthetic-{i}.list"] = synthetic_list(i, args.rules_per_list)
+
+    upstream = Upstream(files, args.latency_ms / 1000, args.bandwidth_kbps * 1024,
+                        args.error_rate, not args.no_304, args.seed)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), make_handler(upstream))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_url = f"http://127.0.0.1:{server.server_port}"
+    upstream.files["QuantumultX.conf"] = URL_PATTERN.sub(lambda m: local_url(server_url, m.group(1)), origin).encode("utf-8")
+    upstream.etags["QuantumultX.conf"] = '"%s"' % hashlib.sha1(upstream.files["QuantumultX.conf"]).hexdigest()
+
+    print(f"上游: {server_url} | 延迟: {args.latency_ms}ms | 带宽: {args.bandwidth_kbps or '不限'} KB/s | "
+          f"错误率: {args.error_rate} | 条件请求: {'否' if args.no_304 else '是'} | 每种模式 {args.runs} 次")
+    results = []
+    try:
+        for scale in scales:
+            samples = {"cold": [], "warm": []}
+            for _ in range(args.runs):
+                workdir = tempfile.mkdtemp(prefix="qx-bench-")
+                try:
+                    prepare_workdir(workdir, server_url, scale)
+                    for mode in ("cold", "warm"):
+                        upstream.reset()
+                        seconds, report = run_build(workdir, server_url)
+                        samples[mode].append({"seconds": seconds, "upstream": dict(upstream.stats), "report": report})
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+
+            for mode, mode_samples in samples.items():
+                summary = summarize(mode_samples)
+                summary.update({"scale": scale, "mode": mode})
+                results.append(summary)
+                print(f"规模 +{scale:>4} 列表 | {mode:>4} | p50: {summary['p50_s']:7.3f}s | p95: {summary['p95_s']:7.3f}s | "
+                      f"传输: {summary['bytes_sent'] / 1024:9.1f}KB | 请求: {summary['requests']:>4} | "
+                      f"304: {summary['not_modified']:>4} | 错误: {summary['errors']:>3}")
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+分流列表精简基准：N 条 IP-CIDR 规则 (每 10 条夹一个被包含的子网)，
+分别测单一策略 (合并网段) 和两种策略交替 (只删除被更早网段包含的规则) 的耗时；
+多策略时与原实现 (逐条与所有更早网段比较，O(n²)) 对比，原实现只在 N 不太大时运行。
+
+用法: python benchmarks/bench_compact.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.compact import compact_rules
+from qx.rules import CIDR_TYPES, parse_network, parse_rule
+
+LEGACY_MAX = 5_000
+
+
+def make_rules(n, policies):
+    lines = []
+    for i in range(n):
+        if i % 10 == 9:
+            # 前一条 /24 里的 /28，应被删除
+            lines.append(f"IP-CIDR,10.{(i - 1) // 256 % 256}.{(i - 1) % 256}.16/28,{policies[i % len(policies)]}")
+        else:
+            lines.append(f"IP-CIDR,10.{i // 256 % 256}.{i % 256}.0/24,{policies[i % len(policies)]}")
+    return [parse_rule(line, "bench.list", line_no) for line_no, line in enumerate(lines, 1)]
+
+
+def compact_legacy(rules):
+    """原实现的多策略分支：逐条与所有更早网段做 subnet_of 比较"""
+    result = []
+    earlier = []
+    for rule in rules:
+        network = parse_network(rule) if rule.type in CIDR_TYPES else None
+        if network is not None:
+            if any(network.version == e.version and network.subnet_of(e) for e in earlier):
+                continue
+            earlier.append(network)
+        result.append(rule)
+    return result
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    for n in (1_000, 5_000, 20_000, 100_000):
+        single, t_single = timed(compact_rules, make_rules(n, ["Proxy"]))
+        rules = make_rules(n, ["Proxy", "DIRECT"])
+        multi, t_multi = timed(compact_rules, rules)
+        line = (f"{n:>7} 条 | 单一策略: {t_single:7.3f}s ({len(single)} 条) "
+                f"| 多策略: {t_multi:7.3f}s ({len(multi)} 条)")
+        if n <= LEGACY_MAX:
+            legacy, t_legacy = timed(compact_legacy, rules)
+            assert legacy == multi
+            line += f" | 原实现: {t_legacy:7.3f}s ({t_legacy / t_multi:6.1f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
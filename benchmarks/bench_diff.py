@@ -0,0 +1,80 @@
+"""
+规则级差异基准：N 行的分流列表改动 1% 的规则并打乱部分顺序 (上游重新排序很常见)，
+对比 difflib 逐行比较与 qx.diff 的哈希行集合 (读文件 + 求差) 的耗时和结果。
+
+difflib 会把挪动位置的规则也算作删除 + 新增，通知中的计数因此虚高；它只在规则数不超过 DIFFLIB_MAX 时运行。
+
+用法: python benchmarks/bench_diff.py
+"""
+import difflib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.diff import diff_digests, line_digest
+
+DIFFLIB_MAX = 50_000
+
+
+def make_lists(n, seed=0):
+    """旧列表和新列表：删除 / 新增各 1% 的规则，并把 5% 的规则挪到别的位置"""
+    rng = random.Random(seed)
+    old = [f"HOST-SUFFIX,bench-{i}.example.com,Proxy" for i in range(n)]
+    new = [line for line in old if rng.random() >= 0.01]
+    new += [f"HOST-SUFFIX,added-{i}.example.net,Proxy" for i in range(n // 100)]
+    for _ in range(n // 20):
+        i, j = rng.randrange(len(new)), rng.randrange(len(new))
+        new[i], new[j] = new[j], new[i]
+    return old, new
+
+
+def diff_difflib(old_path, new_path):
+    with open(old_path, encoding='utf-8') as f:
+        old = [line.strip() for line in f]
+    with open(new_path, encoding='utf-8') as f:
+        new = [line.strip() for line in f]
+    added = removed = 0
+    for line in difflib.ndiff(old, new):
+        if line.startswith("+ "):
+            added += 1
+        elif line.startswith("- "):
+            removed += 1
+    # 挪动位置的规则在 difflib 中同时算作删除和新增，这里只计集合差
+    return len(set(new) - set(old)), len(set(old) - set(new)), added, removed
+
+
+def diff_sets(old_path, new_path):
+    result = diff_digests(line_digest(old_path), line_digest(new_path))
+    return result["added"], result["removed"]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = os.path.join(tmp, "old.list"), os.path.join(tmp, "new.list")
+        for n in (5_000, 20_000, 50_000, 200_000):
+            old, new = make_lists(n)
+            for path, lines in ((old_path, old), (new_path, new)):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+            (added, removed), t_sets = timed(diff_sets, old_path, new_path)
+            line = f"{n:>7} 条 | 行集合: {t_sets:7.3f}s (+{added}/−{removed})"
+            if n <= DIFFLIB_MAX:
+                (set_added, set_removed, ndiff_added, ndiff_removed), t_difflib = timed(diff_difflib, old_path, new_path)
+                assert (added, removed) == (set_added, set_removed)
+                line += (f" | difflib: {t_difflib:7.3f}s (+{ndiff_added}/−{ndiff_removed}, 含挪动位置的规则)"
+                         f" | {t_difflib / t_sets:6.1f}x")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+底包派生基准：同一份解析好的底包派生出 N 个配置，每个配置只改动少数节点
+(清洗一个节点、覆盖 general、追加分流规则和 hostname)。
+对比 copy.deepcopy 与 QXConfigManager.fork (写时复制) 的耗时和常驻内存 (tracemalloc)，
+并校验两种方式渲染出的配置完全一致、底包本身没有被修改。
+
+用法: python benchmarks/bench_fork.py [每个节点行数] [派生配置数]
+"""
+import copy
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.core import QXConfigManager
+
+logging.getLogger("QX-Core").setLevel(logging.WARNING)
+
+SECTIONS = ("dns", "policy", "server_local", "filter_local", "rewrite_local", "task_local")
+
+
+def synthetic_base(lines_per_section):
+    parts = ["[general]"]
+    parts.extend(f"key-{i}=value-{i}" for i in range(50))
+    for sec in SECTIONS:
+        parts.append(f"[{sec}]")
+        parts.extend(f"host-suffix,{sec}-{i}.example.com,美国节点" for i in range(lines_per_section))
+    parts.append("[mitm]")
+    parts.append("hostname=" + ", ".join(f"h{i}.example.com" for i in range(200)))
+    return "\n".join(parts) + "\n"
+
+
+def customize(manager, n):
+    """模拟一个配置的清洗和注入：只改动 policy / general / filter_local / mitm 四个节点"""
+    manager.patch_section("policy", [f"policy-{n}."])
+    manager.set_kv("general", "server_check_url", f"http://example.com/{n}")
+    manager.add_list_item("filter_local", f"host-suffix,profile-{n}.example,direct", "start")
+    manager.set_kv("mitm", "hostname", f"profile-{n}.example.com")
+    manager.flush_hostnames()
+    return manager
+
+
+def derive(base, count, method):
+    """返回 (派生出的配置, 耗时秒, 常驻内存字节)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    derived = [customize(method(base), n) for n in range(count)]
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return derived, elapsed, retained
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    base = QXConfigManager()
+    base._parse(synthetic_base(lines))
+    base_text = base.render()[0]
+
+    deep, t_deep, m_deep = derive(base, count, copy.deepcopy)
+    forked, t_fork, m_fork = derive(base, count, QXConfigManager.fork)
+
+    for a, b in zip(deep, forked):
+        assert a.render()[0] == b.render()[0]
+    assert base.render()[0] == base_text, "底包被派生配置修改了"
+
+    total = sum(len(v) for v in base.sections.values())
+    print(f"底包 {total} 行 × 派生 {count} 个配置")
+    print(f"deepcopy: {t_deep:7.3f}s | 常驻内存: {m_deep / 1024 / 1024:8.2f}MB")
+    print(f"fork    : {t_fork:7.3f}s | 常驻内存: {m_fork / 1024 / 1024:8.2f}MB "
+          f"| 加速: {t_deep / t_fork:5.1f}x | 内存: {m_fork / m_deep * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+底包解析基准：
+1. 随机生成配置文本 (含 CRLF、\r、 、空行、畸形节点头、非法 UTF-8、任意分块边界)，
+   校验 ConfigStreamParser 与原 splitlines + 正则实现的解析结果完全一致；
+2. 在约 50MB 的合成配置上对比两者吞吐。
+
+用法: python benchmarks/bench_parse.py [MB] [随机用例数]
+"""
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.core import ConfigStreamParser
+
+logging.getLogger("QX-Core").setLevel(logging.WARNING)
+
+SECTION_PATTERN = re.compile(r'^\[(.*?)\]')
+
+
+def parse_legacy(data, start_section="header"):
+    """原实现：整体解码 + splitlines + 每行正则"""
+    sections = {start_section: []}
+    current = start_section
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        line = line.strip()
+        match = SECTION_PATTERN.match(line)
+        if match:
+            current = match.group(1)
+            sections.setdefault(current, [])
+        else:
+            sections[current].append(line)
+    return sections, current
+
+
+def parse_stream(data, chunk_size):
+    parser = ConfigStreamParser()
+    for i in range(0, len(data), chunk_size):
+        parser.feed(data[i:i + chunk_size])
+    parser.close()
+    # 节点头偏移必须指向 "["
+    for section, stats in parser.index.items():
+        assert data[stats["offset"]:stats["offset"] + 1] == b"[", (section, stats)
+    return parser.lines, parser.current
+
+
+PIECES = [
+    "host-suffix,apple.com,direct", "  padded line  ", "", "# comment", "[general]", "[ filter_local ]",
+    "[mitm", "[]", "[a]b]", "x[dns]", "中文策略=香港节点", "[policy] trailing", "\t",
+]
+BREAKS = ["\n", "\r\n", "\r", " ", "\x0b", "\x85"]
+
+
+def random_profile(rng):
+    parts = []
+    for _ in range(rng.randint(0, 40)):
+        parts.append(rng.choice(PIECES))
+        parts.append(rng.choice(BREAKS) if rng.random() < 0.8 else "\n")
+    data = "".join(parts).encode("utf-8")
+    if rng.random() < 0.3 and data:
+        # 插入非法 UTF-8 字节
+        pos = rng.randrange(len(data))
+        data = data[:pos] + rng.choice([b"\xff", b"\xe4\xb8", b"\xc3"]) + data[pos:]
+    if rng.random() < 0.5:
+        data = data.rstrip(b"\n")
+    return data
+
+
+def check_equivalence(cases):
+    rng = random.Random(20240501)
+    for n in range(cases):
+        data = random_profile(rng)
+        expected = parse_legacy(data)
+        for chunk_size in (1, 2, 3, 7, 64, 1 << 20):
+            actual = parse_stream(data, chunk_size)
+            if actual != expected:
+                raise AssertionError(f"用例 {n} 分块 {chunk_size} 结果不一致: {data!r}")
+    print(f"✅ 等价性: {cases} 个随机用例 × 6 种分块大小 全部一致")
+
+
+def synthetic_profile(mb):
+    block = []
+    for sec in ("general", "dns", "policy", "server_local", "filter_local", "rewrite_local", "mitm"):
+        block.append(f"[{sec}]")
+        block.extend(f"host-suffix,bench-{i}.example.com,美国节点" for i in range(2000))
+    text = "\n".join(block) + "\n"
+    data = text.encode("utf-8")
+    return data * max(1, int(mb * 1024 * 1024 // len(data)))
+
+
+def main():
+    mb = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    cases = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    check_equivalence(cases)
+
+    data = synthetic_profile(mb)
+    size_mb = len(data) / 1024 / 1024
+    start = time.perf_counter()
+    old = parse_legacy(data)
+    t_old = time.perf_counter() - start
+    start = time.perf_counter()
+    new = parse_stream(data, 64 * 1024)
+    t_new = time.perf_counter() - start
+    assert old == new
+    print(f"{size_mb:.1f}MB | 原实现: {t_old:6.2f}s ({size_mb / t_old:6.1f}MB/s) | "
+          f"流式: {t_new:6.2f}s ({size_mb / t_new:6.1f}MB/s) | 加速: {t_old / t_new:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
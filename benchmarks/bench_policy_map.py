@@ -0,0 +1,58 @@
+"""
+策略映射基准：N 条分流规则 × M 个 policy_map 映射，
+对比原实现 (逐条规则遍历所有映射做子串替换) 与 PolicyMapper 的逐条 / 批量接口。
+
+用法: python benchmarks/bench_policy_map.py [M]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.rules import PolicyMapper
+
+
+def map_legacy(rules, mapping):
+    """原实现：O(规则数 × 映射数) 的子串匹配"""
+    result = []
+    for rule in rules:
+        for k, v in mapping.items():
+            if f", {k}," in rule:
+                rule = rule.replace(f", {k},", f", {v},")
+        result.append(rule)
+    return result
+
+
+def map_each(rules, mapper):
+    return [mapper.map_rule(rule) for rule in rules]
+
+
+def map_batch(rules, mapper):
+    return mapper.map_rules(rules)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    m = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    mapping = {f"node-{j}": f"节点{j}" for j in range(m)}
+    mapper = PolicyMapper(mapping)
+
+    for n in (10_000, 100_000):
+        # 策略字段两边带空格并跟参数，保证原实现也能命中
+        rules = [f"host-suffix,bench-{i}.example.com, node-{i % (m * 2)}, no-resolve" for i in range(n)]
+        old, t_old = timed(map_legacy, rules, mapping)
+        each, t_each = timed(map_each, rules, mapper)
+        batch, t_batch = timed(map_batch, rules, mapper)
+        assert old == each == batch
+        print(f"{n:>7} 条 × {m} 映射 | 原实现: {t_old:7.3f}s | 逐条: {t_each:7.3f}s ({t_old / t_each:5.1f}x) "
+              f"| 批量: {t_batch:7.3f}s ({t_old / t_batch:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
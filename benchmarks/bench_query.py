@@ -0,0 +1,113 @@
+"""
+离线分流查询基准：生成一套合成规则 (HOST / HOST-SUFFIX / HOST-KEYWORD / HOST-WILDCARD / IP-CIDR + FINAL)，
+用 RuleMatcher 批量查询 N 个域名和 IP，对比逐条顺序匹配 (在一个样本上计时后按比例换算)，
+并校验样本上两种方式命中的规则完全一致。
+
+用法: python benchmarks/bench_query.py [查询数] [后缀规则数]
+"""
+import fnmatch
+import ipaddress
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.query import RuleMatcher
+from qx.rules import CIDR_TYPES, parse_network, parse_rule
+
+logging.getLogger("QX-Core").setLevel(logging.WARNING)
+
+POLICIES = ("direct", "proxy", "reject", "美国节点")
+SAMPLE = 500
+
+
+def synthetic_rules(suffixes, rng):
+    lines = []
+    for i in range(suffixes):
+        lines.append(f"host-suffix,site{i}.{rng.choice(('com', 'net', 'cn', 'io'))},{rng.choice(POLICIES)}")
+        if i % 3 == 0:
+            lines.append(f"host,www.host{i}.com,{rng.choice(POLICIES)}")
+        if i % 10 == 0:
+            lines.append(f"ip-cidr,{ipaddress.ip_address(rng.getrandbits(32))}/{rng.randint(8, 24)},{rng.choice(POLICIES)}")
+    for i in range(300):
+        lines.append(f"host-keyword,kw{i}x,{rng.choice(POLICIES)}")
+    for i in range(20):
+        lines.append(f"host-wildcard,*.wild{i}.*,{rng.choice(POLICIES)}")
+    rng.shuffle(lines)
+    lines.append("final,proxy")
+    return [parse_rule(line, "bench", n) for n, line in enumerate(lines, 1)]
+
+
+def synthetic_queries(count, suffixes, rng):
+    queries = []
+    for _ in range(count):
+        r = rng.random()
+        if r < 0.1:
+            queries.append(str(ipaddress.ip_address(rng.getrandbits(32))))
+        elif r < 0.5:
+            queries.append(f"a{rng.randrange(1000)}.site{rng.randrange(suffixes)}.com")
+        elif r < 0.6:
+            queries.append(f"www.host{rng.randrange(suffixes)}.com")
+        elif r < 0.65:
+            queries.append(f"x.kw{rng.randrange(400)}x.org")
+        else:
+            queries.append(f"cdn{rng.randrange(10 ** 6)}.unknown{rng.randrange(100)}.org")
+    return queries
+
+
+def linear_match(rules, query):
+    """逐条顺序匹配，作为正确性参考"""
+    try:
+        address = ipaddress.ip_address(query)
+    except ValueError:
+        address = None
+    for i, rule in enumerate(rules):
+        if rule.type == "final":
+            return i
+        if address is None:
+            if rule.type == "host" and query == rule.value:
+                return i
+            if rule.type == "host-suffix" and (query == rule.value or query.endswith("." + rule.value)):
+                return i
+            if rule.type == "host-keyword" and rule.value in query:
+                return i
+            if rule.type == "host-wildcard" and fnmatch.fnmatchcase(query, rule.value):
+                return i
+        elif rule.type in CIDR_TYPES and address in parse_network(rule):
+            return i
+    return None
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    suffixes = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    rng = random.Random(42)
+    rules = synthetic_rules(suffixes, rng)
+    queries = synthetic_queries(count, suffixes, rng)
+
+    start = time.perf_counter()
+    matcher = RuleMatcher(rules)
+    t_compile = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [matcher.query(q).index for q in queries]
+    t_query = time.perf_counter() - start
+
+    sample = queries[:SAMPLE]
+    start = time.perf_counter()
+    expected = [linear_match(rules, q) for q in sample]
+    t_linear = (time.perf_counter() - start) / len(sample) * count
+
+    mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+    assert mismatches == 0, f"{mismatches} 条查询结果与逐条匹配不一致"
+
+    print(f"{len(rules)} 条规则 | {count} 条查询 | 编译: {t_compile:.3f}s")
+    print(f"RuleMatcher: {t_query:8.3f}s | {count / t_query:10.0f} 条/s")
+    print(f"逐条匹配   : {t_linear:8.1f}s (按 {len(sample)} 条样本换算) | 加速: {t_linear / t_query:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+节点容器基准：向 filter_local 头部注入 N 条规则，对比 Section 与原 list 实现。
+
+用法: python benchmarks/bench_sections.py [N]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from qx.core import Section
+
+
+def inject_list(rules, position):
+    """原实现：list 线性查重 + insert(0)"""
+    section = []
+    for item in rules:
+        if item in section: continue
+        if position == "start": section.insert(0, item)
+        else: section.append(item)
+    return section
+
+
+def inject_section(rules, position):
+    section = Section()
+    for item in rules:
+        if item in section: continue
+        if position == "start": section.prepend(item)
+        else: section.append(item)
+    return section
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rules = [f"host-suffix,bench-{i}.example.com,proxy" for i in range(n)]
+    # 混入 10% 重复规则，覆盖查重路径
+    rules += rules[: n // 10]
+
+    print(f"注入 {n} 条规则 (+{n // 10} 条重复)")
+    for position in ("start", "end"):
+        new, t_new = timed(inject_section, rules, position)
+        old, t_old = timed(inject_list, rules, position)
+        assert list(new) == old
+        print(f"  [{position:>5}] list: {t_old:8.3f}s | Section: {t_new:8.3f}s | 加速: {t_old / t_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
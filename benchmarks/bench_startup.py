@@ -0,0 +1,74 @@
+"""
+冷启动导入耗时基准：在全新的解释器中用 python -X importtime 导入各入口模块，
+统计导入耗时和加载的模块数，并与“模块加载时就导入 requests / yaml”(重构前的行为) 对比。
+
+解释器自身启动时导入的模块 (site 等) 不计入，只统计入口模块引起的导入；每项取多次运行的中位数。
+
+用法: python benchmarks/bench_startup.py [运行次数]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+# (入口模块, 重构前加载时就会导入的重型依赖)
+TARGETS = (
+    ("qx.core", ("requests",)),
+    ("qx.analyze", ("requests",)),
+    ("qx.query", ("requests",)),
+    ("qx.validate", ("requests",)),
+    ("qx.regex", ("requests",)),
+    ("qx.build", ("requests", "yaml")),
+)
+HEAVY = ("requests", "urllib3", "yaml")
+
+
+def import_times(code):
+    """运行一次，返回 {顶层导入的模块: 累计耗时 (微秒)} 和全部导入的模块名"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          env=env, capture_output=True, text=True, check=True)
+    top, names = {}, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        names.append(name.strip())
+        # 顶层导入没有缩进 (名字前只有一个空格)
+        if not name.startswith("  "):
+            top[name.strip()] = int(cumulative)
+    return top, names
+
+
+def measure(code, baseline, runs):
+    """入口代码引起的导入耗时中位数 (毫秒) 和导入的模块"""
+    totals, modules = [], []
+    for _ in range(runs):
+        top, names = import_times(code)
+        totals.append(sum(us for name, us in top.items() if name not in baseline) / 1000)
+        modules = [n for n in names if n not in baseline]
+    return statistics.median(totals), modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    baseline_top, baseline_names = import_times("pass")
+    baseline = set(baseline_names)
+
+    print(f"Python {sys.version.split()[0]} | 每项运行 {runs} 次取中位数 | 解释器启动本身导入 {len(baseline)} 个模块 (不计入)")
+    print(f"{'入口模块':<14}{'导入耗时':>10}{'模块数':>8}{'重型依赖':>10}{'立即导入':>12}{'节省':>10}")
+    for module, eager in TARGETS:
+        lazy_ms, lazy_modules = measure(f"import {module}", baseline, runs)
+        eager_ms, _ = measure(f"import {module}, {', '.join(eager)}", baseline, runs)
+        heavy = sorted({m.split(".")[0] for m in lazy_modules if m.split(".")[0] in HEAVY})
+        print(f"{module:<14}{lazy_ms:>8.1f}ms{len(lazy_modules):>8}{','.join(heavy) or '-':>10}"
+              f"{eager_ms:>10.1f}ms{eager_ms - lazy_ms:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Quantumult X 配置构建器。
+
+子模块按需导入：分析 / 查询等本地工具只加载用到的模块，不会导入 requests / yaml。
+命令行入口见 qx.cli (安装后为 qx 命令)。
+"""
+import os
+
+__version__ = "5.1.0"
+
+
+def _project_root():
+    """项目根目录：在仓库中运行 (含 pip install -e) 时为 src 的上一级，安装到其他位置时为当前工作目录"""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.path.basename(src_dir) == "src":
+        return os.path.dirname(src_dir)
+    return os.getcwd()
+
+
+BASE_DIR = _project_root()
@@ -0,0 +1,228 @@
+"""
+分流规则去重与遮蔽分析：检查合并后的 filter_local 和本地化的 filter_remote 列表，
+找出完全重复、被 HOST-SUFFIX / HOST-KEYWORD 覆盖的域名规则，以及被更大网段包含的 IP-CIDR。
+
+用法:
+    qx analyze [--config MyQuantumultX_Local.conf] [--report report.json] [--prune pruned.conf]
+"""
+import argparse
+import json
+import os
+import re
+from collections import Counter
+
+from . import BASE_DIR
+from .core import QXConfigManager, logger, setup_logging
+from .match import AhoCorasick
+from .rules import CIDR_TYPES, CidrIndex, DomainTrie, cidr_covers, format_rule, load_rule_file, parse_network, parse_rule
+from .store import OBJECTS_DIR, ContentStore
+
+RULES_DIR = os.path.join(BASE_DIR, "rules")
+DEFAULT_CONFIG = os.path.join(BASE_DIR, "MyQuantumultX_Local.conf")
+
+# 规则匹配顺序：本地规则 (final 除外) -> 远程列表 (按引用顺序) -> final
+# 对于完全相同的规则，Quantumult X 本地规则优先生效
+
+
+def parse_remote_line(line):
+    """拆分 filter_remote 行: (url, {参数: 值})"""
+    match = re.match(r'^(https?://[^,]+)(.*)$', line.strip())
+    if not match:
+        return None, {}
+    options = {}
+    for part in match.group(2).split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            options[k.strip().lower()] = v.strip()
+    return match.group(1).strip(), options
+
+
+def remote_list_path(url, rules_dir=RULES_DIR, store=None, section="filter_remote"):
+    """
+    远程链接对应的本地化文件 (section 为非对象链接时所在的节点目录)。
+    对象链接 (.../objects/ab/<sha256>.list) 优先返回可读别名 (如 filter_remote/Apple.list)，报告里更好认。
+    """
+    path = url.split('?')[0]
+    marker = f"/{OBJECTS_DIR}/"
+    if marker in path:
+        relpath = f"{OBJECTS_DIR}/{path.rsplit(marker, 1)[1]}"
+        store = store or ContentStore(rules_dir)
+        entry = store.entry_for_object(relpath)
+        if entry and os.path.exists(store.path(entry["alias"])):
+            return store.path(entry["alias"])
+        return store.path(relpath)
+    file_name = path.split('/')[-1]
+    return os.path.join(rules_dir, section, file_name)
+
+
+def collect_rules(manager, rules_dir=RULES_DIR):
+    """按匹配顺序收集所有规则，本地规则的 source 为 "filter_local"，line_no 为节点内的行号"""
+    local, finals = [], []
+    for pos, line in enumerate(manager.sections.get("filter_local", []), 1):
+        rule = parse_rule(line, "filter_local", pos)
+        if rule:
+            (finals if rule.type == "final" else local).append(rule)
+
+    remote = []
+    store = ContentStore(rules_dir)
+    for line in manager.sections.get("filter_remote", []):
+        url, options = parse_remote_line(line)
+        if not url or options.get("enabled", "true").lower() == "false":
+            continue
+        path = remote_list_path(url, rules_dir, store)
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ [Analyze] 未找到本地化文件，跳过: {path}")
+            continue
+        force_policy = options.get("force-policy")
+        for rule in load_rule_file(path):
+            remote.append(rule._replace(policy=force_policy) if force_policy else rule)
+
+    return local + remote + finals
+
+
+def _same_policy(a, b):
+    return (a.policy or "").lower() == (b.policy or "").lower()
+
+
+def _location(rule):
+    return f"{os.path.basename(rule.source or '?')}:{rule.line_no}"
+
+
+def _finding(kind, rule, cover):
+    same = _same_policy(rule, cover)
+    return {
+        "kind": kind,
+        # redundant: 删除后结果不变；shadowed: 策略不同但永远不会命中
+        "effect": "redundant" if same else "shadowed",
+        "rule": format_rule(rule),
+        "source": _location(rule),
+        "covered_by": format_rule(cover),
+        "covered_by_source": _location(cover),
+        "same_policy": same,
+    }
+
+
+def analyze_rules(rules):
+    """
+    返回 (findings, shadowed_ids)。
+    第一遍按匹配顺序检查每条规则是否已被更早的规则覆盖 (永远不会命中)；
+    第二遍找出被后面同策略规则覆盖的规则 (可删除的冗余候选)。
+    参数不同的规则不算重复；带 no-resolve 的网段不覆盖不带的规则 (见 cidr_covers)。
+    """
+    trie = DomainTrie()
+    cidrs = CidrIndex()
+    exact = {}
+    networks = {}
+    findings = []
+    shadowed = set()
+
+    keyword_ids = [i for i, r in enumerate(rules) if r.type == "host-keyword"]
+    automaton = AhoCorasick(rules[i].value.lower() for i in keyword_ids) if keyword_ids else None
+
+    def earliest_keyword(domain, before):
+        if not automaton:
+            return None
+        hits = [keyword_ids[k] for k in automaton.find_all(domain) if keyword_ids[k] < before]
+        return min(hits) if hits else None
+
+    for i, rule in enumerate(rules):
+        key = (rule.type, rule.value, rule.options)
+        if key in exact:
+            findings.append(_finding("duplicate", rule, rules[exact[key]]))
+            shadowed.add(i)
+            continue
+        exact[key] = i
+
+        cover, kind = None, None
+        if rule.type in ("host", "host-suffix"):
+            suffixes = trie.suffix_matches(rule.value)
+            if suffixes:
+                cover, kind = min(suffixes), "suffix_covered"
+            keyword = earliest_keyword(rule.value, i)
+            if keyword is not None and (cover is None or keyword < cover):
+                cover, kind = keyword, "keyword_covered"
+            trie.insert(rule.value, "suffix" if rule.type == "host-suffix" else "host", i)
+        elif rule.type in CIDR_TYPES:
+            network = parse_network(rule)
+            if network is not None:
+                containing = [j for j in cidrs.containing(network) if cidr_covers(rules[j], rule)]
+                if containing:
+                    cover, kind = min(containing), "cidr_contained"
+                cidrs.insert(network, i)
+                networks[i] = network
+
+        if cover is not None:
+            findings.append(_finding(kind, rule, rules[cover]))
+            shadowed.add(i)
+
+    # 第二遍：被后面同策略规则覆盖 (删除前者，流量仍由后者以相同策略处理)
+    for i, rule in enumerate(rules):
+        if i in shadowed:
+            continue
+        later = []
+        if rule.type in ("host", "host-suffix"):
+            later = [j for j in trie.suffix_matches(rule.value) if j > i]
+        elif i in networks:
+            later = [j for j in cidrs.containing(networks[i]) if j > i and cidr_covers(rules[j], rule)]
+        later = [j for j in later if j not in shadowed and _same_policy(rule, rules[j])]
+        if later:
+            finding = _finding("covered_by_later", rule, rules[min(later)])
+            finding["effect"] = "redundant_candidate"
+            findings.append(finding)
+
+    return findings, shadowed
+
+
+def prune_config(manager, rules, shadowed, output_path):
+    """删除 filter_local 中永远不会命中的规则后另存"""
+    drop = {rules[i].line_no for i in shadowed if rules[i].source == "filter_local"}
+    lines = manager.sections["filter_local"]
+    manager.sections["filter_local"] = [line for pos, line in enumerate(lines, 1) if pos not in drop]
+    manager.save(output_path)
+    return len(drop)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="分流规则去重与遮蔽分析")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="要分析的配置文件 (默认 MyQuantumultX_Local.conf)")
+    parser.add_argument("--rules-dir", default=RULES_DIR, help="本地化规则目录")
+    parser.add_argument("--report", help="输出 JSON 报告路径")
+    parser.add_argument("--prune", help="输出删除无效 filter_local 规则后的配置文件路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    manager = QXConfigManager()
+    manager.load_from_file(args.config)
+
+    rules = collect_rules(manager, args.rules_dir)
+    findings, shadowed = analyze_rules(rules)
+
+    kinds = Counter(f["kind"] for f in findings)
+    effects = Counter(f["effect"] for f in findings)
+    logger.info(f"🔎 [Analyze] 共 {len(rules)} 条规则 | 重复: {kinds['duplicate']} | 后缀覆盖: {kinds['suffix_covered']} | "
+                f"关键词覆盖: {kinds['keyword_covered']} | 网段包含: {kinds['cidr_contained']} | 冗余候选: {kinds['covered_by_later']}")
+    logger.info(f"   └── 冗余 (同策略): {effects['redundant']} | 永不命中 (策略不同): {effects['shadowed']}")
+    for f in findings[:20]:
+        logger.info(f"   • [{f['kind']}] {f['rule']} ({f['source']}) <- {f['covered_by']} ({f['covered_by_source']})")
+
+    if args.report:
+        report = {
+            "config": args.config,
+            "total_rules": len(rules),
+            "summary": {"kinds": dict(kinds), "effects": dict(effects)},
+            "findings": findings,
+        }
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 [Analyze] 报告已写入: {args.report}")
+
+    if args.prune:
+        removed = prune_config(manager, rules, shadowed, args.prune)
+        logger.info(f"✂️ [Analyze] 已移除 {removed} 条无效本地规则 -> {args.prune}")
+
+
+if __name__ == "__main__":
+    main()
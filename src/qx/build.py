@@ -0,0 +1,1014 @@
+import os
+import sys
+import logging
+import re
+import time
+import argparse
+import hashlib
+import json
+import glob
+from collections import namedtuple
+
+from . import BASE_DIR
+from .core import QXConfigManager, logger, setup_logging
+from .net import HostRateLimiter, HttpCache, HttpClient, conditional_get, fetch_all, file_sha256, get_client, set_client
+from .state import ArtifactManifest, BuildState, builder_fingerprint
+from .diff import format_counts
+from .compact import compact_data, compact_stats, log_stats, min_path
+from .store import OBJECTS_DIR, ContentStore
+from .validate import log_config_issues, log_file_report, validate_config, validate_file, validate_files
+from .rules import PolicyMapper
+from .profiler import BuildProfiler, get_profiler, record_bytes, set_profiler
+
+# === 路径定义 ===
+# 构建器代码所在目录 (代码变化时所有缓存的阶段结果失效)
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_DIR = os.path.join(BASE_DIR, "profiles")
+CONFIG_PATH = os.path.join(PROFILES_DIR, "config.yaml")
+OUTPUT_FILE = os.path.join(BASE_DIR, "MyQuantumultX.conf")
+LOCALIZED_OUTPUT_FILE = os.path.join(BASE_DIR, "MyQuantumultX_Local.conf")
+RULES_DIR = os.path.join(BASE_DIR, "rules")
+# HTTP 条件请求缓存清单 (ETag / Last-Modified)，随规则一起提交以便下次构建复用
+HTTP_CACHE_FILE = os.path.join(RULES_DIR, "http_cache.json")
+# 增量构建清单 (各阶段输入指纹和产物哈希)
+BUILD_STATE_FILE = os.path.join(RULES_DIR, "build_state.json")
+# 产物内容清单 (配置和本地化规则的哈希 / 大小 / 行数)，用于判断本次构建改动了哪些文件
+ARTIFACT_MANIFEST_FILE = os.path.join(RULES_DIR, "artifacts.json")
+# 重写正则分析缓存 (按正则文本记录耗时和超线性检测结果)，开启 build.regex_audit 时使用
+REGEX_CACHE_FILE = os.path.join(RULES_DIR, "regex_cache.json")
+# 构建报告 (各阶段耗时、字节数、HTTP 请求、内存峰值)，与产物放在一起
+BUILD_REPORT_FILE = os.path.join(BASE_DIR, "build_report.json")
+# 本次构建的规则级变化报告 (每个文件新增 / 删除的规则)
+CHANGES_REPORT_FILE = os.path.join(BASE_DIR, "build_changes.json")
+# 设置环境变量 QX_CPROFILE=1 时输出 cProfile 结果
+PROFILE_OUTPUT_FILE = os.path.join(BASE_DIR, "build_profile.prof")
+
+# ==========================================
+# 🔴 GitHub 仓库 Raw 链接前缀配置
+# ==========================================
+# 优先从环境变量读取，读取不到则使用这里配置的值
+URL_RAW_PREFIX = "https://raw.githubusercontent.com/suversal/qx-config-sync/main/rules"
+
+# ==========================================
+# 📱 Telegram 通知配置 (可选)
+# ==========================================
+# 优先从环境变量读取，读取不到则使用这里配置的值
+TELEGRAM_BOT_TOKEN = "xxx"
+TELEGRAM_CHAT_ID = "xxx"
+# Bot API 地址：测试时可用环境变量 TELEGRAM_API_URL 指向本地的模拟服务
+TELEGRAM_API_URL = "https://api.telegram.org"
+# 单条消息的长度上限 (Telegram 为 4096 字符)，超出时按行拆成多条发送
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# ==========================================
+# ⚡️ 远程规则并发下载配置
+# ==========================================
+# 可被 config.yaml 的 build 节点或命令行 --max-workers 覆盖
+DEFAULT_MAX_WORKERS = 4
+# 同一域名每秒请求数 / 突发上限 (替代原先每个请求后固定 sleep 1 秒)
+HOST_RATE_LIMIT = 1.0
+HOST_RATE_BURST = 2
+# 第二次保存前的产物校验: rollback (无效文件回滚) / strict (有无效文件或配置问题即构建失败) / off
+DEFAULT_VALIDATE = "rollback"
+VALIDATE_MODES = ("rollback", "strict", "off")
+
+# KV 类型的节点 (覆盖式)
+KV_SECTIONS = {"general", "mitm", "http_backend"}
+
+# 【关键修改】需要特殊处理的节点列表 (在通用循环中跳过)
+# local_filters: 有 top/bottom 逻辑，需单独处理
+# filter_remote: 内容是字典，需单独处理
+# remote_filters: 兼容旧版本字段
+# base/patches/policy_map/build: 非节点配置
+SKIP_SECTIONS = [
+    "base", "patches", "policy_map", "build",
+    "local_filters", "remote_filters",
+    "filter_remote" # <--- 这次报错就是因为缺了这个
+]
+
+# 单个配置的输入和产物路径 (多配置构建时每个 profiles/*.yaml 一份)
+ProfileTarget = namedtuple("ProfileTarget", ["name", "config_path", "output", "localized_output", "state_path"])
+
+def parse_args(argv=None):
+    """命令行参数"""
+    parser = argparse.ArgumentParser(description="Quantumult X 配置构建器")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help=f"远程规则并发下载数 (默认读取 config.yaml 的 build.max_workers，否则为 {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略增量构建清单，强制执行全部阶段")
+    parser.add_argument("--include-graph", metavar="PATH", default=None,
+                        help="把 file:// 引用关系图 (引用方、被引用次数、循环引用) 写入 JSON 文件")
+    parser.add_argument("--all-profiles", action="store_true",
+                        help="构建 profiles/ 下的全部 *.yaml：底包和远程规则只下载一次，各配置并行合成")
+    parser.add_argument("--profile-workers", type=int, default=None,
+                        help="多配置构建时并行合成的进程数 (默认为 CPU 核数)")
+    return parser.parse_args(argv)
+
+def check_environment():
+    """环境自检"""
+    if not os.path.exists(RULES_DIR):
+        try:
+            os.makedirs(RULES_DIR)
+            logger.info(f"📂 [Init] 自动创建规则目录: {RULES_DIR}")
+        except Exception:
+            pass
+
+def profile_target(config_path):
+    """配置文件对应的产物路径：config.yaml 沿用原来的文件名，其他配置在文件名中加上配置名"""
+    name = os.path.splitext(os.path.basename(config_path))[0]
+    if os.path.abspath(config_path) == os.path.abspath(CONFIG_PATH):
+        return ProfileTarget(name, config_path, OUTPUT_FILE, LOCALIZED_OUTPUT_FILE, BUILD_STATE_FILE)
+    output_dir = os.path.dirname(OUTPUT_FILE)
+    return ProfileTarget(
+        name, config_path,
+        os.path.join(output_dir, f"MyQuantumultX_{name}.conf"),
+        os.path.join(output_dir, f"MyQuantumultX_{name}_Local.conf"),
+        os.path.join(RULES_DIR, f"build_state_{name}.json"),
+    )
+
+def discover_profiles(all_profiles=False):
+    """要构建的配置：默认只有 config.yaml；--all-profiles 时为 profiles/*.yaml (config.yaml 排在最前)"""
+    if not all_profiles:
+        return [profile_target(CONFIG_PATH)]
+    paths = sorted(glob.glob(os.path.join(PROFILES_DIR, "*.yaml")))
+    paths.sort(key=lambda path: os.path.abspath(path) != os.path.abspath(CONFIG_PATH))
+    if not paths:
+        raise FileNotFoundError(f"配置目录中没有 *.yaml: {PROFILES_DIR}")
+    return [profile_target(path) for path in paths]
+
+def load_config(path):
+    if not os.path.exists(path):
+        logger.error(f"❌ 找不到配置文件: {path}")
+        raise FileNotFoundError(f"配置文件不存在: {path}")
+    # 延迟导入：只有构建需要读取 YAML，分析类工具不加载
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def include_graph_path(path, target):
+    """引用关系图输出路径；非 config.yaml 的配置加上配置名，如 graph_ipad.json"""
+    if not path or target.output == OUTPUT_FILE:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{target.name}{ext}"
+
+def download_bases(urls, cache):
+    """
+    每个底包只下载一次，存入 rules/base 供所有配置共用，返回 {url: 本地路径或 None}。
+    不同链接的文件名相同时，后出现的链接在文件名后加上链接哈希，避免互相覆盖。
+    """
+    downloader = QXConfigManager()
+    paths = {}
+    owners = {}
+    for url in dict.fromkeys(urls):
+        path = downloader.base_cache_path(url)
+        if owners.get(path, url) != url:
+            stem, ext = os.path.splitext(path)
+            path = f"{stem}-{hashlib.sha256(url.encode()).hexdigest()[:8]}{ext}"
+        owners[path] = url
+        paths[url] = downloader.download_base(url, cache, path)
+    return paths
+
+def expand_rules(manager, raw_rules, _stack=()):
+    """递归展开 file:// 引用，_stack 为当前的引用链，用于发现循环引用"""
+    final_rules = []
+    if not raw_rules: return []
+    # 兼容单个字符串的情况
+    if isinstance(raw_rules, str): raw_rules = [raw_rules]
+
+    for rule in raw_rules:
+        # 过滤 None 或空字符串 (防止 YAML 解析出 None 导致崩溃)
+        if not rule:
+            continue
+
+        # 如果规则是字典 (比如错误地进入了这里)，跳过或报错，防止崩溃
+        if isinstance(rule, dict):
+            logger.warning(f"⚠️ [Skip] 跳过无法解析的字典规则: {rule}")
+            continue
+
+        # 处理文件引用
+        if rule.startswith("file://"):
+            file_path = rule.replace("file://", "").strip()
+            # 这里的日志由 Core 打印
+            file_content = manager.include_file(file_path, _stack)
+            if file_content is None:
+                continue
+            final_rules.extend(expand_rules(manager, file_content, _stack + (os.path.normpath(file_path),)))
+        else:
+            final_rules.append(rule)
+    return final_rules
+
+def resolve_rules(manager, raw_rules, mapping=None, policy_only=True):
+    """
+    解析规则 (支持 file:// 和 策略映射)。
+    mapping 为 PolicyMapper 或 policy_map 字典；policy_only=True 时只替换分流规则的策略字段。
+    """
+    rules = expand_rules(manager, raw_rules)
+    if mapping:
+        mapper = mapping if isinstance(mapping, PolicyMapper) else PolicyMapper(mapping)
+        rules = mapper.map_rules(rules, policy_only)
+    return rules
+
+def dump_include_graph(manager, path):
+    """输出 file:// 引用关系图"""
+    report = manager.include_graph_report()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"🕸️ [Include] 引用关系图已写入: {path} | 文件: {len(report['references'])} | 循环: {len(report['cycles'])}")
+
+def compact_object(store, relpath, artifacts=None):
+    """精简一个已本地化的分流列表，结果存为新对象，别名为 xxx.min.list；不是规则列表时返回 None"""
+    entry = store.entry_for_object(relpath)
+    source = store.path(relpath)
+    result = compact_data(source) if entry else None
+    if result is None:
+        return None
+    data, rules_before, rules_after = result
+    alias = min_path(entry["alias"])
+    # 别名会被覆盖，先记下旧内容的规则集合，用于统计规则级变化
+    if artifacts:
+        artifacts.snapshot(store.path(alias))
+    output_relpath, written = store.put_bytes(data, alias)
+    stats = compact_stats(store.path(entry["alias"]), store.path(alias), os.path.getsize(source),
+                          rules_before, rules_after, written)
+    stats["object"] = output_relpath
+    log_stats(stats)
+    if artifacts:
+        artifacts.record(stats["output"], written)
+    return stats
+
+def compact_localized_lists(manager, github_prefix, store, artifacts=None, compacted=None):
+    """
+    把本地化的分流列表精简为 .min 版本，并让配置改为引用精简后的对象。
+    compacted: {对象路径: 统计} 多个配置共用，同一列表只精简一次
+    """
+    logger.info("🗜️ [Compact] 开始精简本地化分流列表...")
+    compacted = {} if compacted is None else compacted
+    prefix = f"{github_prefix}/{OBJECTS_DIR}/"
+    new_lines = []
+    all_stats = []
+    for line in manager.sections.get("filter_remote", []):
+        match = re.match(r'^(https?://[^,]+)(.*)$', line.strip()) if line else None
+        if match and match.group(1).startswith(prefix):
+            relpath = match.group(1)[len(github_prefix) + 1:]
+            if relpath not in compacted:
+                compacted[relpath] = compact_object(store, relpath, artifacts)
+            stats = compacted[relpath]
+            if stats:
+                all_stats.append(stats)
+                line = f"{github_prefix}/{stats['object']}{match.group(2)}"
+        new_lines.append(line)
+    manager.sections["filter_remote"] = new_lines
+
+    before = sum(s["bytes_before"] for s in all_stats)
+    after = sum(s["bytes_after"] for s in all_stats)
+    logger.info(f"📊 [Compact] 精简 {len(all_stats)} 个列表 | 合计 {before / 1024:.2f}KB -> {after / 1024:.2f}KB")
+    return all_stats
+
+def split_message(message, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    把过长的消息按行拆成多段，每段不超过 limit 个字符；多段时在末尾标注序号。
+    HTML 标签都在同一行内，按行拆分不会截断标签；单行超长时才在行内硬切。
+    """
+    if len(message) <= limit:
+        return [message]
+    # 给序号 "\n(12/12)" 预留位置
+    budget = limit - 16
+    chunks, current = [], ""
+    for line in message.splitlines(keepends=True):
+        while len(line) > budget:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:budget])
+            line = line[budget:]
+        if len(current) + len(line) > budget:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current.strip():
+        chunks.append(current)
+    return [f"{chunk.rstrip()}\n({i}/{len(chunks)})" for i, chunk in enumerate(chunks, 1)]
+
+def send_telegram_message(bot_token, chat_id, message):
+    """发送 Telegram 消息通知；超过长度上限时拆成多条依次发送，全部成功才返回 True"""
+    if not bot_token or not chat_id:
+        logger.debug("⚠️ 未配置 Telegram，跳过通知")
+        return False
+
+    api_url = os.environ.get('TELEGRAM_API_URL', TELEGRAM_API_URL).rstrip("/")
+    url = f"{api_url}/bot{bot_token}/sendMessage"
+    chunks = split_message(message)
+    try:
+        for chunk in chunks:
+            data = {
+                "chat_id": chat_id,
+                "text": chunk,
+                "parse_mode": "HTML",
+                "disable_web_page_preview": True
+            }
+            response = get_client().post(url, data=data, timeout=10)
+            response.raise_for_status()
+        parts = f" (分 {len(chunks)} 条)" if len(chunks) > 1 else ""
+        logger.info(f"📤 [Telegram] 通知发送成功{parts}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ [Telegram] 通知发送失败: {e}")
+        return False
+
+def format_change(change):
+    """
+    单个产物变化的简要描述，如 "+42/−7 in Apple.list"；
+    配置文件附带按节点的计数，如 "+3/−1 in MyQuantumultX.conf [filter_remote +2/−1, rewrite_local +1]"。
+    取不到旧内容时退回到行数和大小的差值，如 "Apple.list (+12 条, +0.35KB)"
+    """
+    name = os.path.basename(change["path"])
+    if "added" in change:
+        text = f"{format_counts(change['added'], change['removed'])} in {name}"
+        if change["old_sha256"] is None:
+            text += " (新增)"
+        if change["sections"]:
+            # 节点头之前的行 (如脚本注释头后的规则) 归入 "" 组，显示为 "其他"
+            text += " [" + ", ".join(f"{section or '其他'} {format_counts(c['added'], c['removed'])}"
+                                     for section, c in change["sections"].items()) + "]"
+        return text
+    if change["old_sha256"] is None:
+        return f"{name} (新增, {change['rules_delta']} 条)"
+    return f"{name} ({change['rules_delta']:+d} 条, {change['size_delta'] / 1024:+.2f}KB)"
+
+def build_notification_message(build_success, stats, changes):
+    """构建通知消息"""
+    from datetime import datetime
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 从 GitHub Actions 环境变量获取额外信息
+    github_repo = os.environ.get('GITHUB_REPOSITORY', '')
+    github_sha = os.environ.get('GITHUB_SHA', '')[:7]  # 只取短哈希
+
+    status_emoji = "✅" if build_success else "❌"
+    status_text = "构建成功" if build_success else "构建失败"
+
+    message = (
+        f"{status_emoji} <b>Quantumult X 配置自动构建完成</b>\n\n"
+        f"⏰ <b>构建时间:</b> {now}\n"
+    )
+
+    # 如果在 GitHub Actions 运行，添加仓库信息
+    if github_repo:
+        repo_url = f"https://github.com/{github_repo}"
+        message += f"📦 <b>仓库:</b> <a href=\"{repo_url}\">{github_repo}</a>\n"
+        if github_sha:
+            commit_url = f"{repo_url}/commit/{github_sha}"
+            message += f"🔖 <b>最新提交:</b> <a href=\"{commit_url}\">{github_sha}</a>\n"
+
+    message += (
+        f"\n📊 <b>构建统计</b>\n"
+        f"• 远程规则下载: {stats['download_success']} 成功, {stats['download_failed']} 失败\n"
+        f"• 注入自定义规则: {stats['rules_added']} 条\n"
+    )
+    if 'cache_hit' in stats:
+        message += f"• 缓存命中: {stats['cache_hit']} 未变化, {stats['cache_miss']} 重新下载\n"
+    for stage in stats.get('stages', []):
+        message += f"• 增量构建 {stage}\n"
+
+    if changes:
+        message += f"\n🔄 <b>检测到配置更新:</b> {len(changes)} 个文件"
+        if any("added" in c for c in changes):
+            added = sum(c.get("added", 0) for c in changes)
+            removed = sum(c.get("removed", 0) for c in changes)
+            message += f", 规则 {format_counts(added, removed)}"
+        message += "\n"
+        for change in changes:
+            message += f"  • {format_change(change)}\n"
+    else:
+        message += f"\n✓ <b>配置文件无变化</b>\n"
+
+    if stats['download_failed'] > 0:
+        message += f"\n⚠️ 注意: 有 {stats['download_failed']} 个文件下载失败，请检查日志\n"
+    if stats.get('download_invalid') or stats.get('rolled_back'):
+        message += (f"⚠️ 校验: {stats.get('download_invalid', 0)} 个文件内容无效 (保留原链接), "
+                    f"{stats.get('rolled_back', 0)} 个回滚到上次的版本\n")
+
+    message += f"\n#QXConfig #AutoSync"
+    return message
+
+def apply_config(manager, config):
+    """在底包基础上执行清洗和注入 (构建步骤 2~5)"""
+    profiler = get_profiler()
+
+    # 2. 全局清洗 (Patches)
+    if config and 'patches' in config:
+        with profiler.stage("patches"):
+            logger.info("🧹 [Step] 执行配置清洗 (Patches)...")
+            for section, rules in config['patches'].items():
+                manager.patch_section(section, rules.get('keywords', []), rules.get('strategy', 'blacklist'))
+
+    # 3. 动态处理大部分节点 (General, DNS, Policy, Rewrite...)
+    # 策略映射只编译一次，供所有节点复用
+    policy_map = PolicyMapper(config.get('policy_map') if config else None)
+
+    with profiler.stage("sections"):
+        if config:
+            for section_name, content in config.items():
+                # 跳过特殊处理的字段
+                if section_name in SKIP_SECTIONS:
+                    continue
+
+                # 处理 KV 节点 (General, MITM) - 覆盖模式
+                if section_name in KV_SECTIONS:
+                    if isinstance(content, dict):
+                        for k, v in content.items():
+                            # 支持 mitm hostname 引用文件
+                            if isinstance(v, str) and v.startswith("file://"):
+                                resolved = resolve_rules(manager, [v], None)
+                                v = resolved[0] if resolved else ""
+                            manager.set_kv(section_name, k, str(v))
+
+                # 处理 List 节点 (DNS, Policy, Server...) - 追加模式
+                else:
+                    if isinstance(content, list):
+                        # 这里只会处理纯字符串列表，不会再处理 filter_remote 的字典了
+                        # 分流规则只替换策略字段，其他节点 (如 policy 策略组) 替换任意完整字段
+                        rules = resolve_rules(manager, content, policy_map, policy_only=(section_name == "filter_local"))
+                        if rules:
+                            logger.info(f"⚡️ [Inject] 向 [{section_name}] 注入 {len(rules)} 条规则")
+                            for rule in rules:
+                                # 【修改】对于 rewrite_remote，强制插入到头部 (start)
+                                if section_name == "rewrite_remote":
+                                    manager.add_list_item(section_name, rule, position="start")
+                                else:
+                                    manager.add_list_item(section_name, rule)
+
+    # 4. 专门处理本地分流 (Local Filters - 支持 top/bottom)
+    with profiler.stage("local_filters"):
+        if config and 'local_filters' in config:
+            logger.info("🌪 [Step] 处理本地分流 (Local Filters)...")
+            if 'top' in config['local_filters']:
+                rules = resolve_rules(manager, config['local_filters']['top'], policy_map)
+                logger.info(f"   └── 注入 Top 规则: {len(rules)} 条")
+                for r in rules: manager.add_list_item("filter_local", r, "start")
+
+            if 'bottom' in config['local_filters']:
+                rules = resolve_rules(manager, config['local_filters']['bottom'], policy_map)
+                logger.info(f"   └── 注入 Bottom 规则: {len(rules)} 条")
+                for r in rules: manager.add_list_item("filter_local", r, "end")
+
+    # 5. 专门处理远程分流 (Remote Filters / filter_remote)
+    # 兼容两种写法：标准的 filter_remote 和 旧版的 remote_filters
+    with profiler.stage("remote_filters"):
+        remote_conf = config.get('filter_remote') or config.get('remote_filters')
+
+        if remote_conf:
+            logger.info("☁️ [Step] 处理远程引用 (Remote Filters)...")
+            for item in remote_conf:
+                # 必须是字典格式才能处理
+                if not isinstance(item, dict):
+                    continue
+
+                source = item.get('source')
+                if source == 'blackmatrix7':
+                    name = item['name']
+                    url = f"https://raw.githubusercontent.com/blackmatrix7/ios_rule_script/master/rule/QuantumultX/{name}/{name}.list"
+                else:
+                    url = item.get('url')
+
+                if url:
+                    manager.add_remote_rule(url, item.get('tag', 'Remote'), policy_map.get(item.get('policy'), item.get('policy')))
+
+def write_build_report(profiler, profile=None):
+    """输出构建报告；开启 QX_CPROFILE 时同时保存 cProfile 结果 (可用 snakeviz / pstats 查看)"""
+    profiler.write(BUILD_REPORT_FILE)
+    if profile:
+        profile.disable()
+        profile.dump_stats(PROFILE_OUTPUT_FILE)
+        logger.info(f"🔬 [Profile] cProfile 结果已写入: {PROFILE_OUTPUT_FILE}")
+
+# 已解析的底包: {路径: ((mtime_ns, size), manager)}，同一进程内的多个配置共用一份解析结果
+_base_templates = {}
+
+def load_base_template(base_path):
+    """解析底包 (文件未变化时复用上次的结果)；返回的 manager 只用于 fork，不直接修改"""
+    st = os.stat(base_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _base_templates.get(base_path)
+    if cached and cached[0] == stamp:
+        logger.info(f"♻️ [Base] 复用已解析的底包: {base_path}")
+        return cached[1]
+    template = QXConfigManager()
+    template.load_from_file(base_path)
+    _base_templates[base_path] = (stamp, template)
+    return template
+
+def compose_profile(target, config, base_path, include_graph=None):
+    """合成单个配置 (步骤 2~6)：从共享的底包派生，清洗、注入后第一次保存"""
+    profiler = get_profiler()
+    logger.info(f"🧩 [Profile] 开始合成配置: {target.name}")
+    if base_path and os.path.exists(base_path):
+        # 底包只解析一次，各配置得到写时复制的副本，只复制被改动的节点
+        with profiler.stage("base_parse"):
+            manager = load_base_template(base_path).fork()
+    else:
+        manager = QXConfigManager()
+
+    # 2~5. 清洗、注入本地规则和远程引用
+    apply_config(manager, config)
+    if include_graph:
+        dump_include_graph(manager, include_graph)
+
+    # 6. 第一次保存：输出合并后的原始配置文件
+    print("-" * 50)
+    logger.info(f"💾 [Step] 第一次保存: 生成原始配置文件 -> {os.path.basename(target.output)}")
+    with profiler.stage("save"):
+        written = manager.save(target.output)
+    return {
+        "manager": manager,
+        "written": written,
+        "stats": dict(manager.stats),
+        "input_files": dict(manager.input_files),
+    }
+
+def _compose_in_subprocess(job):
+    """进程池入口：子进程使用自己的计时器，返回可序列化的结果 (manager 留在子进程)"""
+    profiler = BuildProfiler()
+    set_profiler(profiler)
+    result = compose_profile(*job)
+    del result["manager"]
+    result["stages"] = profiler.stages
+    return result
+
+def run_compose_jobs(jobs, max_workers=None, label_stages=False):
+    """
+    合成多个配置，返回 {配置名: 结果}。
+    jobs: [(target, config, base_path, include_graph)]
+    任务多于一个时在子进程中并行执行 (结果不含 manager)；否则在当前进程执行，结果带 manager 供后续步骤直接使用。
+    label_stages: 给计时阶段加上配置名前缀，如 "ipad/patches"
+    """
+    profiler = get_profiler()
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs)))
+    results = {}
+    if workers == 1:
+        for job in jobs:
+            first = len(profiler.stages)
+            results[job[0].name] = compose_profile(*job)
+            if label_stages:
+                for stage in profiler.stages[first:]:
+                    stage["stage"] = f"{job[0].name}/{stage['stage']}"
+        return results
+
+    # 进程池相关模块导入较慢，只在真正并行时导入
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f"🧩 [Profile] 并行合成 {len(jobs)} 个配置 | 进程数: {workers}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job, result in zip(jobs, pool.map(_compose_in_subprocess, jobs)):
+            for stage in result.pop("stages"):
+                if label_stages:
+                    stage["stage"] = f"{job[0].name}/{stage['stage']}"
+                profiler.stages.append(stage)
+            results[job[0].name] = result
+    return results
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    logger.info("🚀 === QX Builder V5.1 (Fixed) Started ===")
+    check_environment()
+
+    profile = None
+    if os.environ.get("QX_CPROFILE"):
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    profiler = BuildProfiler()
+    set_profiler(profiler)
+
+    # 优先读取 Telegram 配置
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN', TELEGRAM_BOT_TOKEN)
+    chat_id = os.environ.get('TELEGRAM_CHAT_ID', TELEGRAM_CHAT_ID)
+
+    try:
+        targets = discover_profiles(args.all_profiles)
+        configs = {target.name: load_config(target.config_path) for target in targets}
+        # 多配置构建时日志、阶段计时和增量清单都带上配置名
+        multi = len(targets) > 1
+        if multi:
+            logger.info(f"🧩 [Profile] 多配置构建: {', '.join(configs)}")
+
+        def stage_name(target, stage):
+            return f"{target.name}/{stage}" if multi else stage
+
+        http_cache = HttpCache(HTTP_CACHE_FILE)
+
+        # 构建参数 (命令行优先于配置文件)；下载相关参数所有配置共用，取第一个配置 (config.yaml)
+        first_config = configs[targets[0].name]
+        build_conf = (first_config.get('build') if first_config else None) or {}
+        max_workers = args.max_workers or build_conf.get('max_workers', DEFAULT_MAX_WORKERS)
+
+        # 整个构建共用一个带连接池的 HTTP 客户端 (底包、远程规则、Telegram)
+        set_client(HttpClient(
+            pool_size=max(16, max_workers),
+            retries=build_conf.get('http_retries', 3),
+            timeouts=build_conf.get('http_timeouts')
+        ))
+        profiler.client = get_client()
+        profiler.cache = http_cache
+
+        # 1. 下载底包 (每个底包只下载一次，各配置共用 rules/base 中的副本)
+        base_urls = {}
+        for target in targets:
+            config = configs[target.name]
+            base_urls[target.name] = config['base']['url'] if config and 'base' in config else None
+        base_paths = {}
+        if any(base_urls.values()):
+            with profiler.stage("base"):
+                base_paths = download_bases([url for url in base_urls.values() if url], http_cache)
+
+        # 增量构建：配置、本地文件、底包内容和构建器代码都没变时，直接复用上次生成的原始配置
+        artifacts = ArtifactManifest(ARTIFACT_MANIFEST_FILE, BASE_DIR)
+        builder = builder_fingerprint(PACKAGE_DIR)
+        states = {}
+        managers = {}
+        jobs = []
+        for target in targets:
+            state = states[target.name] = BuildState(target.state_path, BASE_DIR, target.name if multi else None)
+            base_url = base_urls[target.name]
+            compose_inputs = {
+                "builder": builder,
+                "config": file_sha256(target.config_path),
+                "base": (http_cache.entries.get(base_url) or {}).get("sha256") if base_url else None,
+            }
+            if state.should_skip("compose", compose_inputs, [target.output], force=args.force):
+                manager = QXConfigManager()
+                with profiler.stage(stage_name(target, "compose_reuse")):
+                    manager.load_from_file(target.output)
+                manager.stats.update(state.previous_stage("compose").get("stats", {}))
+                managers[target.name] = manager
+                if args.include_graph:
+                    logger.warning(f"⚠️ [Include] {target.name} 合成阶段已跳过，未生成引用关系图 (可加 --force)")
+            else:
+                job = (target, configs[target.name], base_paths.get(base_url), include_graph_path(args.include_graph, target))
+                jobs.append((job, compose_inputs))
+
+        # 2~6. 清洗、注入并第一次保存；多个配置在子进程中并行合成
+        # 配置文件会被就地覆盖，先记下旧内容的规则集合，用于统计规则级变化
+        for job, _ in jobs:
+            artifacts.snapshot(job[0].output)
+        results = run_compose_jobs([job for job, _ in jobs], args.profile_workers, label_stages=multi)
+        for job, compose_inputs in jobs:
+            target = job[0]
+            result = results[target.name]
+            if result["written"]:
+                artifacts.record(target.output, result["written"])
+            state = states[target.name]
+            state.record("compose", compose_inputs, {"stats": result["stats"]})
+            state.record_input_files(result["input_files"])
+            state.record_outputs([target.output])
+
+            manager = result.get("manager")
+            if manager is None:
+                # 子进程合成的配置从刚写出的文件读回
+                manager = QXConfigManager()
+                with profiler.stage(stage_name(target, "load")):
+                    manager.load_from_file(target.output)
+                manager.stats.update(result["stats"])
+            managers[target.name] = manager
+
+        validate = build_conf.get('validate', DEFAULT_VALIDATE)
+        if validate not in VALIDATE_MODES:
+            raise ValueError(f"build.validate 只能是 {' / '.join(VALIDATE_MODES)}: {validate}")
+        # host_rate 为 0 时不限速；突发量小于 1 时令牌永远攒不够一个，会一直等待
+        host_rate = float(build_conf.get('host_rate', HOST_RATE_LIMIT))
+        host_burst = float(build_conf.get('host_burst', HOST_RATE_BURST))
+        if host_rate < 0:
+            raise ValueError(f"build.host_rate 不能小于 0: {host_rate}")
+        if host_rate and host_burst < 1:
+            raise ValueError(f"build.host_burst 不能小于 1: {host_burst}")
+
+        # 7. 抓取远程文件存入内容寻址存储，并把配置中的链接改为对象链接 (所有配置共用一次下载)
+        # 优先从环境变量读取，读取不到使用代码中配置的值
+        url_raw_prefix = os.environ.get('URL_RAW_PREFIX', URL_RAW_PREFIX)
+        print("-" * 50)
+        store = ContentStore(RULES_DIR)
+        with profiler.stage("localize"):
+            all_download_stats = localize_remote_rules(
+                [managers[target.name] for target in targets], url_raw_prefix,
+                max_workers=max_workers,
+                host_rate=host_rate,
+                host_burst=host_burst,
+                cache=http_cache,
+                artifacts=artifacts,
+                store=store,
+                validate=validate,
+                validate_workers=build_conf.get('validate_workers')
+            )
+            http_cache.save()
+
+        compacted = {}
+        regex_cache = None
+        for target in targets:
+            manager = managers[target.name]
+            state = states[target.name]
+            target_build_conf = (configs[target.name] or {}).get('build') or {}
+
+            # 7.1 可选：精简本地化的分流列表 (去注释 / 去重 / 合并网段)，配置改为引用 .min 文件
+            compact_lists = bool(target_build_conf.get('compact_lists'))
+            if compact_lists:
+                with profiler.stage(stage_name(target, "compact")):
+                    compact_localized_lists(manager, url_raw_prefix, store, artifacts, compacted)
+
+            # 7.2 校验输出配置 (策略组、规则语法、策略引用、重写正则)，strict 时有问题直接失败
+            if validate != "off":
+                with profiler.stage(stage_name(target, "validate_config")):
+                    issues = validate_config(manager)
+                log_config_issues(os.path.basename(target.localized_output), issues)
+                if issues and validate == "strict":
+                    raise RuntimeError(f"{target.name} 输出配置校验失败: {len(issues)} 个问题")
+
+            # 7.3 可选：分析重写正则 (灾难性回溯 / 超线性 / 重复和覆盖)，结果按正则文本缓存
+            if target_build_conf.get('regex_audit'):
+                from .regex import RegexCache, audit_rewrites, log_audit
+                regex_cache = regex_cache or RegexCache(REGEX_CACHE_FILE)
+                with profiler.stage(stage_name(target, "regex_audit")):
+                    report = audit_rewrites(manager, RULES_DIR, regex_cache, store)
+                log_audit(os.path.basename(target.localized_output), report)
+
+            # 8. 第二次保存：输出替换为你个人仓库直链的新配置文件
+            # 本地化结果只取决于原始配置和替换后的远程链接 (对象链接随内容变化，也反映了下载失败和精简)
+            print("-" * 50)
+            # 与渲染 / 解析一致：忽略空行和首尾空白，保证刚合成的配置和从文件读回的配置指纹相同
+            remote_links = [line.strip() for sec in ("filter_remote", "rewrite_remote")
+                            for line in manager.sections.get(sec, []) if line and line.strip()]
+            localize_inputs = {
+                "compose_output": file_sha256(target.output),
+                "url_prefix": hashlib.sha256(url_raw_prefix.encode()).hexdigest(),
+                "remote_links": hashlib.sha256("\n".join(remote_links).encode()).hexdigest(),
+            }
+            if not state.should_skip("save_localized", localize_inputs, [target.localized_output], force=args.force):
+                logger.info(f"💾 [Step] 第二次保存: 生成本地化后的全新配置文件 -> {os.path.basename(target.localized_output)}")
+                with profiler.stage(stage_name(target, "save_localized")):
+                    artifacts.snapshot(target.localized_output)
+                    written = manager.save(target.localized_output)
+                    if written:
+                        artifacts.record(target.localized_output, written)
+                state.record("save_localized", localize_inputs)
+                state.record_outputs([target.localized_output])
+            state.save()
+        if regex_cache is not None:
+            regex_cache.save()
+        # 清理不再引用的对象和别名 (要在精简之后，精简结果也是对象)
+        store.save()
+
+        # 检查文件变化：写文件时已对比内容哈希，这里直接汇总
+        changes = artifacts.changes()
+        artifacts.save()
+        artifacts.write_changes(CHANGES_REPORT_FILE)
+        if changes:
+            logger.info(f"📢 检测到有文件变化: {', '.join(format_change(c) for c in changes)}")
+        else:
+            logger.info("✓ 无文件变化")
+
+        cache_summary = http_cache.summary()
+        logger.info(f"📈 [Cache] 条件请求: {cache_summary['cache_hit']} 命中 (304), {cache_summary['cache_miss']} 未命中")
+        conn_stats = get_client().connection_stats()
+        logger.info(f"🔌 [HTTP] 请求: {conn_stats['requests']} | 新建连接: {conn_stats['connections_opened']} | 复用连接: {conn_stats['connections_reused']}")
+        logger.info("✨ === Build Complete ===")
+
+        # Telegram 通知 - 构建成功 (多配置时为所有配置的合计)
+        if bot_token and chat_id:
+            stats = {
+                "download_success": sum(s["success"] for s in all_download_stats),
+                "download_failed": sum(s["failed"] for s in all_download_stats),
+                "download_invalid": sum(s["invalid"] for s in all_download_stats),
+                "rolled_back": sum(s["rolled_back"] for s in all_download_stats),
+                "rules_added": sum(m.stats["rules_added"] for m in managers.values()),
+                # 包含底包在内的全部条件请求
+                **http_cache.summary(),
+                "stages": [line for target in targets for line in states[target.name].summary()]
+            }
+            message = build_notification_message(True, stats, changes)
+            send_telegram_message(bot_token, chat_id, message)
+
+        write_build_report(profiler, profile)
+        # 返回成功退出码
+        sys.exit(0)
+
+    except Exception as e:
+        # 构建失败，发送 Telegram 通知
+        logger.error(f"❌ 构建失败: {e}")
+        if bot_token and chat_id:
+            from datetime import datetime
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            github_repo = os.environ.get('GITHUB_REPOSITORY', '')
+
+            message = (
+                f"❌ <b>Quantumult X 配置构建失败</b>\n\n"
+                f"⏰ <b>失败时间:</b> {now}\n"
+            )
+            if github_repo:
+                repo_url = f"https://github.com/{github_repo}"
+                message += f"📦 <b>仓库:</b> <a href=\"{repo_url}\">{github_repo}</a>\n"
+
+            message += (
+                f"\n⚠️ <b>错误信息:</b>\n"
+                f"<code>{str(e)}</code>\n\n"
+                f"请前往 GitHub Action 查看完整日志\n\n"
+                f"#QXConfig #BuildFailed"
+            )
+            send_telegram_message(bot_token, chat_id, message)
+
+        write_build_report(profiler, profile)
+        # 返回失败退出码
+        sys.exit(1)
+
+def _download_rule(url, store, cache=None, artifacts=None):
+    """下载单个远程规则文件存入对象存储，返回 (字节数, 是否命中缓存, 内容是否变化)"""
+    # 模拟 QX 客户端的 UA，使用 requests 统一 HTTP 客户端
+    headers = {'User-Agent': 'Quantumult X/1.0.31'}
+    response = conditional_get(url, store.local_path(url), cache, headers=headers, timeout=15, stream=True)
+    if response is None:
+        # 304: 上游未变化，对象保持不动
+        return store.touch(url).size, True, False
+
+    # 流式写入临时文件，按内容哈希存为对象；相同内容只存一份
+    result = store.put_response(url, response)
+    record_bytes("bytes_in", result.size)
+    if result.changed:
+        record_bytes("bytes_out", result.size)
+    if cache:
+        cache.store(url, response, result.sha256, result.size)
+    if artifacts:
+        with store.lock:
+            alias = store.index[url]["alias"]
+        previous = store.previous_object(url)
+        artifacts.record(store.path(alias), result, previous=store.path(previous) if previous else None)
+    return result.size, False, result.changed
+
+def localize_remote_rules(managers, github_prefix, max_workers=DEFAULT_MAX_WORKERS,
+                          host_rate=HOST_RATE_LIMIT, host_burst=HOST_RATE_BURST, cache=None, artifacts=None, store=None,
+                          validate=DEFAULT_VALIDATE, validate_workers=None):
+    """
+    抓取远程链接存入内容寻址存储 (store，默认 rules/objects)，替换为自己仓库中的对象链接。
+    managers 为一个或多个配置，所有配置引用的链接合并后只下载一次；返回与 managers 对应的下载统计列表。
+    validate 为 rollback / strict / off：下载完成后校验文件内容，无效时回滚或直接让构建失败。
+    """
+    logger.info("🌐 [Localize] 开始抓取并本地化远程规则链接...")
+    store = store or ContentStore(RULES_DIR)
+    aliases = {}
+    all_plans = [_plan_localization(manager, store, aliases) for manager in managers]
+
+    # 第二遍：并发下载 (全局并发上限 + 按域名令牌桶限速)
+    def worker(url):
+        logger.info(f"⬇️ 正在下载: {url}")
+        return _download_rule(url, store, cache, artifacts)
+
+    results = fetch_all(
+        list(aliases), worker,
+        max_workers=max_workers,
+        limiter=HostRateLimiter(host_rate, host_burst) if host_rate else None
+    )
+    results = {r.url: r for r in results}
+
+    outcome = {}
+    if validate != "off":
+        with get_profiler().stage("validate"):
+            parsers = {target[0] for plans in all_plans for plan in plans.values() for _, target in plan
+                       if target and "opt-parser=true" in target[1].replace(" ", "").lower()}
+            outcome = validate_localized(store, [url for url in aliases if results[url].ok], parsers,
+                                         cache, artifacts, validate_workers, strict=validate == "strict")
+
+    return [_apply_localization(manager, plans, results, store, aliases, github_prefix, outcome)
+            for manager, plans in zip(managers, all_plans)]
+
+def validate_localized(store, urls, parsers, cache=None, artifacts=None, max_workers=None, strict=False):
+    """
+    在进程池中校验本次构建引用的本地化文件，parsers 为开启 opt-parser 的链接。
+    已通过校验的对象 (如 304 未变化) 不再重复校验，多个链接共用的对象只校验一次。
+    内容无效时回滚到下载前的对象 (同样要通过校验)；没有可回滚的对象时放弃，配置保留原始链接。
+    返回 {链接: "rolled_back" / "invalid"}；strict 时存在无效文件直接抛出异常。
+    """
+    jobs = {}
+    for url in urls:
+        relpath = store.object_of(url)
+        if relpath is None or store.is_validated(url, url in parsers):
+            continue
+        kind = store.index[url]["alias"].split("/", 1)[0]
+        jobs.setdefault((store.path(relpath), kind, url in parsers), []).append(url)
+    keys = list(jobs)
+    reports = validate_files(keys, max_workers)
+
+    outcome = {}
+    for (path, kind, opt_parser), report in zip(keys, reports):
+        for url in jobs[(path, kind, opt_parser)]:
+            alias = store.index[url]["alias"]
+            log_file_report(report, alias)
+            if report["valid"]:
+                store.mark_validated(url, opt_parser)
+                continue
+            previous = store.previous_object(url)
+            if previous and validate_file(store.path(previous), kind, opt_parser)["valid"]:
+                store.rollback(url)
+                store.mark_validated(url, opt_parser)
+                outcome[url] = "rolled_back"
+            else:
+                store.discard(url)
+                outcome[url] = "invalid"
+            # 不保留无效内容的缓存记录，下次构建重新完整下载；产物清单恢复为上次构建的记录
+            if cache:
+                cache.forget(url)
+            if artifacts:
+                artifacts.revert(store.path(alias))
+
+    invalid = [store.index[url]["alias"] for url in outcome]
+    logger.info(f"🧪 [Validate] 文件: {len(reports)} | 无效: {len(invalid)} | "
+                f"回滚: {sum(v == 'rolled_back' for v in outcome.values())}")
+    if strict and invalid:
+        raise RuntimeError(f"{len(invalid)} 个本地化文件校验失败: {', '.join(invalid)}")
+    return outcome
+
+def _plan_localization(manager, store, aliases):
+    """第一遍：收集配置中所有需要下载的链接 (保持原有行序)，链接 -> 可读别名登记到 aliases"""
+    sections_to_process = ["filter_remote", "rewrite_remote"]
+    plans = {}
+    for sec in sections_to_process:
+        if sec not in manager.sections:
+            continue
+
+        plan = []
+        for line in manager.sections[sec]:
+            if not line or line.startswith("#") or line.startswith(";"):
+                plan.append((line, None))
+                continue
+
+            # 正则匹配提取 URL 和后面的参数(如 tag=xxx)
+            match = re.match(r'^(https?://[^,]+)(.*)$', line.strip())
+            if not match:
+                plan.append((line, None))
+                continue
+
+            original_url = match.group(1)
+            rest_of_line = match.group(2)
+
+            # 提取文件名
+            file_name = original_url.split('/')[-1]
+            if "?" in file_name: file_name = file_name.split("?")[0]
+            if not file_name: file_name = "unknown.txt"
+
+            # 同一链接只分配一次别名 (文件名与其他链接冲突时由存储加上哈希后缀)
+            if original_url not in aliases:
+                aliases[original_url] = store.alias_for(original_url, sec, file_name)
+            plan.append((line, (original_url, rest_of_line, file_name)))
+        plans[sec] = plan
+    return plans
+
+def _apply_localization(manager, plans, results, store, aliases, github_prefix, outcome=None):
+    """第三遍：按原顺序回填，保证输出与串行版本一致，返回该配置的下载统计"""
+    outcome = outcome or {}
+    download_stats = {"success": 0, "failed": 0, "cache_hit": 0, "cache_miss": 0, "changed": 0, "failed_urls": [],
+                      "rolled_back": 0, "invalid": 0, "invalid_urls": []}
+    for sec, plan in plans.items():
+        new_lines = []
+        for line, target in plan:
+            if target is None:
+                new_lines.append(line)
+                continue
+
+            original_url, rest_of_line, file_name = target
+            result = results[original_url]
+            if outcome.get(original_url) == "invalid":
+                logger.error(f"  ❌ 校验失败 {original_url}，保留原链接")
+                new_lines.append(line)
+                download_stats["invalid"] += 1
+                download_stats["invalid_urls"].append(original_url)
+            elif result.ok:
+                size, cached, changed = result.value
+                if outcome.get(original_url) == "rolled_back":
+                    logger.warning(f"   ⏪ 内容无效，沿用上次的版本: {file_name} -> {aliases[original_url]}")
+                    download_stats["rolled_back"] += 1
+                elif cached:
+                    logger.info(f"   ♻️ 未变化 (304): {file_name} ({size / 1024:.2f} KB)")
+                    download_stats["cache_hit"] += 1
+                else:
+                    state = "已更新" if changed else "内容相同，跳过写入"
+                    logger.info(f"   ✅ 下载成功: {file_name} ({size / 1024:.2f} KB, {state}) -> {aliases[original_url]}")
+                    download_stats["cache_miss"] += 1
+                    if changed: download_stats["changed"] += 1
+                # 替换为自己仓库中的对象链接 (内容不变时链接不变)
+                new_url = f"{github_prefix}/{store.object_of(original_url)}"
+                new_lines.append(f"{new_url}{rest_of_line}")
+                download_stats["success"] += 1
+            else:
+                logger.error(f"  ❌ 下载失败 {original_url}: {result.error}")
+                new_lines.append(line) # 下载失败则保留原链接，防止丢失
+                download_stats["failed"] += 1
+                download_stats["failed_urls"].append(original_url)
+
+        # 更新内存中的配置列表
+        manager.sections[sec] = new_lines
+
+    logger.info(f"📊 [Localize] 本地化完成: {download_stats['success']} 成功, {download_stats['failed']} 失败 | 缓存: {download_stats['cache_hit']} 命中, {download_stats['cache_miss']} 未命中")
+    if download_stats["invalid"] or download_stats["rolled_back"]:
+        logger.warning(f"   └── 校验: {download_stats['invalid']} 个无效 (保留原链接), {download_stats['rolled_back']} 个回滚到上次的版本")
+    return download_stats
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
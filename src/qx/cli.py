@@ -0,0 +1,52 @@
+"""
+命令行入口 (pip install -e . 后为 qx 命令，也可以 python -m qx)：
+
+    qx [build] [--force] [--all-profiles] ...   构建配置 (默认子命令，等同于 python src/main.py)
+    qx analyze / query / validate / regex / compact ...
+
+子命令按需导入对应模块：分析、查询、校验等本地工具不会加载 requests / yaml，适合在 pre-commit 钩子里频繁运行。
+"""
+import importlib
+import sys
+
+from . import __version__
+
+# 子命令 -> (模块, 说明)
+COMMANDS = {
+    "build": ("qx.build", "构建配置 (下载底包和远程规则、合成、本地化)"),
+    "analyze": ("qx.analyze", "分流规则去重与遮蔽分析"),
+    "query": ("qx.query", "离线查询域名 / IP 命中的分流规则"),
+    "validate": ("qx.validate", "校验本地化文件和输出配置"),
+    "regex": ("qx.regex", "重写正则性能与重复分析"),
+    "compact": ("qx.compact", "精简分流列表"),
+}
+DEFAULT_COMMAND = "build"
+
+
+def usage():
+    lines = [f"qx {__version__}", "", "用法: qx [子命令] [参数]  (省略子命令时为 build)", "", "子命令:"]
+    lines += [f"  {name:<10}{help_text}" for name, (_, help_text) in COMMANDS.items()]
+    lines += ["", "各子命令的参数见 qx <子命令> --help"]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv and argv[0] in ("-V", "--version"):
+        print(__version__)
+        return 0
+    command = DEFAULT_COMMAND
+    if argv and not argv[0].startswith("-"):
+        command = argv.pop(0)
+    if command not in COMMANDS:
+        print(f"未知的子命令: {command}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+本地化分流列表精简：规范化规则类型、去掉注释和重复规则、
+删除已被 HOST-SUFFIX 覆盖的域名规则、把相邻/重叠的 IP-CIDR 合并成最小覆盖集合。
+
+用法:
+    qx compact rules/filter_remote/Apple.list [更多文件...]
+"""
+import ipaddress
+import os
+import sys
+
+from .core import logger, setup_logging
+from .net import atomic_write_bytes
+from .rules import CIDR_TYPES, CidrIndex, DomainTrie, cidr_covers, format_rule, parse_network, parse_rule
+
+# 精简后的文件名后缀: Apple.list -> Apple.min.list
+MIN_SUFFIX = ".min"
+
+
+def min_path(path):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}{MIN_SUFFIX}{ext}"
+
+
+def read_rules(path):
+    """读取并解析列表；存在无法识别的非注释行 (如 YAML / 脚本) 时返回 None，表示不处理该文件"""
+    rules = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f, 1):
+            stripped = line.strip()
+            if not stripped or stripped[0] in "#;":
+                continue
+            rule = parse_rule(stripped, path, line_no)
+            if rule is None:
+                return None
+            rules.append(rule)
+    return rules
+
+
+def compact_rules(rules):
+    """
+    返回精简后的规则列表，匹配结果与原列表一致：
+    - 被更早规则覆盖的规则永远不会命中，总是可以删除；
+    - 整个列表只有一种策略时，顺序不影响结果，可按任意位置的覆盖关系删除并合并网段。
+    参数 (如 no-resolve) 不同的规则匹配范围不同：去重按 (类型, 值, 参数) 判断，网段只在参数相同的组内合并，
+    带 no-resolve 的网段不覆盖不带的规则 (见 cidr_covers)。
+    """
+    single_policy = len({(r.policy or "").lower() for r in rules}) <= 1
+
+    # 1. 完全重复 (类型 + 值 + 参数) 只保留第一条
+    seen = set()
+    unique = []
+    for rule in rules:
+        key = (rule.type, rule.value, rule.options)
+        if key not in seen:
+            seen.add(key)
+            unique.append(rule)
+
+    # 2. 域名规则：HOST / HOST-SUFFIX 被 HOST-SUFFIX 覆盖
+    trie = DomainTrie()
+    for i, rule in enumerate(unique):
+        if rule.type == "host-suffix":
+            trie.insert(rule.value, "suffix", i)
+
+    def covered(i, rule):
+        if rule.type not in ("host", "host-suffix"):
+            return False
+        for j in trie.suffix_matches(rule.value):
+            if j == i:
+                continue
+            if j < i or single_policy:
+                return True
+        return False
+
+    kept = [(i, r) for i, r in enumerate(unique) if not covered(i, r)]
+
+    # 3. IP 段：单一策略时按 (类型, 参数) 分组合并成最小覆盖集合，放在该组第一条的位置
+    if single_policy:
+        slots = []
+        groups = {}
+        for _, rule in kept:
+            network = parse_network(rule) if rule.type in CIDR_TYPES else None
+            if network is None:
+                slots.append(("rule", rule))
+                continue
+            key = (rule.type, rule.options)
+            if key not in groups:
+                groups[key] = (rule, [])
+                slots.append(("group", key))
+            groups[key][1].append(network)
+
+        result = []
+        for kind, item in slots:
+            if kind == "rule":
+                result.append(item)
+            else:
+                template, networks = groups[item]
+                result.extend(template._replace(value=str(net)) for net in ipaddress.collapse_addresses(networks))
+        return result
+
+    # 多策略列表只删除被更早网段包含的规则 (按前缀长度分桶查询，每条规则最多查 33/129 个桶)
+    result = []
+    earlier = CidrIndex()
+    for _, rule in kept:
+        network = parse_network(rule) if rule.type in CIDR_TYPES else None
+        if network is not None:
+            if any(cidr_covers(cover, rule) for cover in earlier.containing(network)):
+                continue
+            earlier.insert(network, rule)
+        result.append(rule)
+    return result
+
+
+def compact_data(path):
+    """精简一个列表文件，返回 (精简后的内容, 原规则数, 精简后规则数)；文件不是规则列表时返回 None"""
+    rules = read_rules(path)
+    if rules is None:
+        return None
+    compacted = compact_rules(rules)
+    data = "".join(f"{format_rule(rule)}\n" for rule in compacted).encode("utf-8")
+    return data, len(rules), len(compacted)
+
+
+def compact_stats(source, output, bytes_before, rules_before, rules_after, written):
+    return {
+        "source": source,
+        "output": output,
+        "bytes_before": bytes_before,
+        "bytes_after": written.size,
+        "rules_before": rules_before,
+        "rules_after": rules_after,
+        "changed": written.changed,
+        "write": written,
+    }
+
+
+def compact_file(path, output_path=None):
+    """
+    精简一个列表文件并写到 output_path (默认 xxx.min.list)。
+    返回统计字典；文件不是规则列表时返回 None。
+    """
+    result = compact_data(path)
+    if result is None:
+        return None
+    data, rules_before, rules_after = result
+    output_path = output_path or min_path(path)
+    written = atomic_write_bytes(output_path, data)
+    return compact_stats(path, output_path, os.path.getsize(path), rules_before, rules_after, written)
+
+
+def log_stats(stats):
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    ratio = saved / stats["bytes_before"] * 100 if stats["bytes_before"] else 0
+    logger.info(f"🗜️ [Compact] {os.path.basename(stats['source'])}: "
+                f"{stats['rules_before']} -> {stats['rules_after']} 条 | "
+                f"{stats['bytes_before'] / 1024:.2f}KB -> {stats['bytes_after'] / 1024:.2f}KB (-{ratio:.1f}%)")
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    setup_logging()
+    for path in paths:
+        stats = compact_file(path)
+        if stats is None:
+            logger.warning(f"⚠️ [Compact] 不是分流规则列表，跳过: {path}")
+        else:
+            log_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,650 @@
+import os
+import copy
+import logging
+import time
+from collections import OrderedDict, deque
+
+from . import BASE_DIR
+from .net import atomic_write_bytes, conditional_get, file_sha256, iter_file_chunks, stream_to_file
+from .match import KeywordMatcher
+from .profiler import record_bytes
+
+logger = logging.getLogger("QX-Core")
+
+
+def setup_logging():
+    """
+    全局日志配置。由命令行入口调用，导入本模块时不改动全局 logging，
+    作为库使用 (如基准脚本、其他工具导入) 时由调用方自行配置。
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
+
+class Section:
+    """
+    节点内容容器：保持插入顺序 (deque 两端 O(1) 插入)，
+    同时维护 行 -> 出现次数 的哈希索引，成员判断 O(1)。
+    迭代、len、bool 行为与原来的 list 一致。
+    snapshot() 得到的快照与原节点共享数据，任一方第一次修改时才复制 (写时复制)。
+    """
+
+    __slots__ = ("_lines", "_index", "_version", "_shared")
+
+    def __init__(self, lines=()):
+        self._lines = deque()
+        self._index = {}
+        self._version = 0
+        self._shared = False
+        for line in lines:
+            self.append(line)
+
+    def snapshot(self):
+        """O(1) 快照：不复制行数据，之后哪一方先修改就由哪一方复制"""
+        clone = Section.__new__(Section)
+        clone._lines = self._lines
+        clone._index = self._index
+        clone._version = self._version
+        clone._shared = self._shared = True
+        return clone
+
+    def _own(self):
+        """修改前调用：数据仍可能与快照共享时先复制一份"""
+        if self._shared:
+            self._lines = deque(self._lines)
+            self._index = dict(self._index)
+            self._shared = False
+
+    @property
+    def version(self):
+        """每次修改递增，供外部索引判断是否需要重建"""
+        return self._version
+
+    def _track(self, line):
+        self._index[line] = self._index.get(line, 0) + 1
+        self._version += 1
+
+    def _untrack(self, line):
+        count = self._index[line] - 1
+        if count: self._index[line] = count
+        else: del self._index[line]
+        self._version += 1
+
+    def append(self, line):
+        self._own()
+        self._lines.append(line)
+        self._track(line)
+
+    def prepend(self, line):
+        self._own()
+        self._lines.appendleft(line)
+        self._track(line)
+
+    def insert(self, position, line):
+        """兼容 list.insert；头尾插入为 O(1)"""
+        if position == 0:
+            self.prepend(line)
+        elif position >= len(self._lines):
+            self.append(line)
+        else:
+            self._own()
+            self._lines.insert(position, line)
+            self._track(line)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def remove(self, line):
+        self._own()
+        self._lines.remove(line)
+        self._untrack(line)
+
+    def __contains__(self, line):
+        return line in self._index
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(self._lines)[position]
+        return self._lines[position]
+
+    def __setitem__(self, position, line):
+        self._own()
+        self._untrack(self._lines[position])
+        self._lines[position] = line
+        self._track(line)
+
+    def __eq__(self, other):
+        if isinstance(other, Section):
+            return self._lines == other._lines
+        if isinstance(other, list):
+            return list(self._lines) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Section({list(self._lines)!r})"
+
+
+class HostnameSet:
+    """
+    MITM hostname 集合：按规范化形式 (去空白、小写、去末尾点) 保序去重，判重 O(1)。
+    apple.com 与 *.apple.com 视为不同条目。
+    """
+
+    def __init__(self, value=""):
+        self.hosts = {}
+        self.dirty = False
+        self.add(value)
+        self.dirty = False
+
+    @staticmethod
+    def canonical(host):
+        return host.strip().lower().rstrip(".")
+
+    def add(self, value):
+        """合并逗号分隔的 hostname，返回新增的条目"""
+        added = []
+        for token in value.split(","):
+            key = self.canonical(token)
+            if key and key not in self.hosts:
+                self.hosts[key] = token.strip()
+                added.append(token.strip())
+        if added:
+            self.dirty = True
+        return added
+
+    def serialize(self):
+        return ", ".join(self.hosts.values())
+
+    def __contains__(self, host):
+        return self.canonical(host) in self.hosts
+
+    def __len__(self):
+        return len(self.hosts)
+
+
+class SectionMap(OrderedDict):
+    """节点表：赋值时自动把 list 包装成 Section，兼容 manager.sections[sec] = new_lines 的写法"""
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, Section):
+            value = Section(value)
+        super().__setitem__(key, value)
+
+
+class ConfigStreamParser:
+    """
+    流式配置解析器：按字节块喂入 (feed)，不需要先拿到完整文本。
+    每次处理到最后一个换行为止的整段数据 (整段解码 + splitlines)，剩余半行留到下一块；
+    只有行首字符为 "[" 的行才检查是否为节点头，结果与整体 splitlines + 正则解析一致。
+    index 记录本次解析到的每个节点: {节点: {"offset": 节点头的字节偏移, "lines": 行数}}。
+    """
+
+    def __init__(self, start_section="header"):
+        self.current = start_section
+        # 按出现顺序收集的行: {节点: [行]}
+        self.lines = {start_section: []}
+        self.index = {}
+        self.bytes = 0
+        self._pending = b""
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        data = self._pending + chunk if self._pending else chunk
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            self._pending = data
+            return
+        self._pending = data[cut:]
+        self._consume(data[:cut] if cut < len(data) else data)
+
+    def close(self):
+        """处理最后一行 (没有换行结尾)"""
+        if self._pending:
+            self._consume(self._pending)
+            self._pending = b""
+        return self
+
+    def _consume(self, block):
+        # 切分点都在 \n 之后：UTF-8 多字节字符不含 0x0A，\r\n 也不会被拆开，分段处理与整体处理结果相同
+        stripped = [line.strip() for line in block.decode('utf-8', errors='replace').splitlines()]
+        headers = [i for i, line in enumerate(stripped) if line[:1] == "[" and "]" in line]
+
+        target = self.lines[self.current]
+        stats = self.index.get(self.current)
+        prev = 0
+        search_from = 0
+        for i in headers:
+            target.extend(stripped[prev:i])
+            if stats is not None:
+                stats["lines"] += i - prev
+            line = stripped[i]
+            self.current = line[1:line.index("]", 1)]
+            target = self.lines.setdefault(self.current, [])
+            if self.current not in self.index:
+                # 含非法字节的节点头只按替换字符之前的部分定位
+                position = self._locate(block, line.split("\ufffd", 1)[0].encode('utf-8'), search_from)
+                search_from = position + 1
+                self.index[self.current] = {"offset": self.bytes + position, "lines": 0}
+            stats = self.index[self.current]
+            prev = i + 1
+        target.extend(stripped[prev:])
+        if stats is not None:
+            stats["lines"] += len(stripped) - prev
+        self.bytes += len(block)
+
+    @staticmethod
+    def _locate(block, needle, start):
+        """节点头在 block 中的字节位置 (必须位于行首，前面只能是空白)；找不到时返回 start"""
+        pos = start
+        while True:
+            found = block.find(needle, pos)
+            if found == -1:
+                return start
+            prefix = block[block.rfind(b"\n", 0, found) + 1:found].decode('utf-8', errors='replace')
+            if not (prefix + "[").splitlines()[-1][:-1].strip():
+                return found
+            pos = found + 1
+
+
+class QXConfigManager:
+    def __init__(self):
+        self.sections = SectionMap()
+
+        # 定义标准顺序
+        standard_order = [
+            "general", "dns", "policy",
+            "server_local", "server_remote",
+            "filter_local", "filter_remote",
+            "rewrite_local", "rewrite_remote",
+            "task_local", "http_backend", "mitm"
+        ]
+
+        self.sections["header"] = []
+        for sec in standard_order:
+            self.sections[sec] = []
+
+        self.current_section = "header"
+        # 节点渲染缓存: {节点: (Section 对象, 版本号, 文本, 行数)}，两次保存之间未修改的节点不重复渲染
+        self.render_cache = {}
+        # 最近一次解析的节点索引: {节点: {"offset": 字节偏移, "lines": 行数}}
+        self.parse_index = {}
+
+        # 统计数据
+        self.stats = {"files_read": 0, "rules_added": 0, "rules_removed": 0, "remote_refs": 0}
+        # 补丁关键词命中次数: {section: {keyword: hits}}
+        self.patch_hits = {}
+        # KV 节点索引: {section: (Section, version, {key: [行号]})}
+        self.kv_index = {}
+        # hostname 集合: {section: HostnameSet}，保存时统一写回 (行号在写回时重新查找，节点可能已被改动)
+        self.hostnames = {}
+        # 读取过的 file:// 文件: {绝对路径: sha256 或 None}，供增量构建判断输入是否变化
+        self.input_files = {}
+        # file:// 解析缓存: {绝对路径: ((mtime_ns, size), 规则列表)}，同一文件多处引用只读取解析一次
+        self.rule_file_cache = {}
+        # 引用关系图: {引用方: [被引用的文件]}，顶层引用的引用方为 "config.yaml"
+        self.include_graph = {}
+        # 检测到的循环引用，每项为引用路径 [a, b, a]
+        self.include_cycles = []
+        # 每个文件被引用的总次数
+        self.include_refs = {}
+
+        # 项目根目录 (file:// 引用和底包缓存都相对于它)
+        self.project_root = BASE_DIR
+        logger.info(f"📂 [Init] 项目根目录锁定: {self.project_root}")
+
+    def fork(self):
+        """
+        派生一个新的配置：所有节点都是写时复制的快照，只有之后被修改的节点才会复制。
+        同一份解析好的底包可以低成本地派生出多个配置，彼此 (以及原配置) 互不影响。
+        """
+        self.flush_hostnames()
+        clone = copy.copy(self)
+        clone.sections = SectionMap()
+        for section, lines in self.sections.items():
+            clone.sections[section] = lines.snapshot()
+        # 未修改的节点继续复用已渲染的文本
+        clone.render_cache = {}
+        for section, cached in self.render_cache.items():
+            lines = self.sections.get(section)
+            if cached[0] is lines and cached[1] == lines.version:
+                clone.render_cache[section] = (clone.sections[section],) + cached[1:]
+        clone.kv_index = {}
+        clone.hostnames = {}
+        clone.parse_index = dict(self.parse_index)
+        clone.stats = dict(self.stats)
+        clone.patch_hits = {section: dict(hits) for section, hits in self.patch_hits.items()}
+        clone.input_files = dict(self.input_files)
+        # 缓存的规则列表不会被修改 (读取时返回副本)，可以直接共享
+        clone.rule_file_cache = dict(self.rule_file_cache)
+        clone.include_graph = {parent: list(children) for parent, children in self.include_graph.items()}
+        clone.include_cycles = [list(cycle) for cycle in self.include_cycles]
+        clone.include_refs = dict(self.include_refs)
+        return clone
+
+    def base_cache_path(self, url):
+        """底包本地缓存路径 (配合 HTTP 缓存清单，304 时直接读取)"""
+        file_name = url.split('/')[-1].split('?')[0] or "base.conf"
+        return os.path.join(self.project_root, "rules", "base", file_name)
+
+    def load_from_url(self, url, cache=None):
+        start_time = time.time()
+        logger.info(f"📥 [Base] 开始下载底包: {url}")
+        try:
+            headers = {'User-Agent': 'QuantumultX-Builder/5.0'}
+            cache_path = self.base_cache_path(url)
+            parser = ConfigStreamParser(self.current_section)
+            resp = conditional_get(url, cache_path, cache, headers=headers, timeout=30, stream=True)
+            if resp is None:
+                logger.info(f"♻️ [Base] 底包未变化 (304)，使用本地缓存: {cache_path}")
+                for chunk in iter_file_chunks(cache_path):
+                    parser.feed(chunk)
+            elif cache:
+                # 边下载边解析，同时写入本地缓存
+                written = stream_to_file(resp, cache_path, on_chunk=parser.feed)
+                if written.changed:
+                    record_bytes("bytes_out", written.size)
+                cache.store(url, resp, written.sha256, written.size)
+            else:
+                try:
+                    for chunk in resp.iter_content(chunk_size=64 * 1024):
+                        parser.feed(chunk)
+                finally:
+                    resp.close()
+
+            # 下载完整后才写入节点，中途失败不会留下半个底包
+            self._apply_parsed(parser.close())
+            record_bytes("bytes_in", parser.bytes)
+            size_kb = parser.bytes / 1024
+            elapsed = (time.time() - start_time) * 1000
+            logger.info(f"✅ [Base] 下载成功 | 耗时: {elapsed:.2f}ms | 大小: {size_kb:.2f}KB")
+        except Exception as e:
+            logger.error(f"❌ [Base] 下载失败: {e}")
+            # 不抛出异常，允许无底包运行
+
+    def download_base(self, url, cache=None, cache_path=None):
+        """
+        只下载底包到本地缓存 (304 时不动)，不解析，返回缓存路径；失败返回 None。
+        构建时由主进程下载一次，各配置再用 load_from_file 解析。
+        """
+        start_time = time.time()
+        logger.info(f"📥 [Base] 开始下载底包: {url}")
+        cache_path = cache_path or self.base_cache_path(url)
+        try:
+            headers = {'User-Agent': 'QuantumultX-Builder/5.0'}
+            resp = conditional_get(url, cache_path, cache, headers=headers, timeout=30, stream=True)
+            if resp is None:
+                logger.info(f"♻️ [Base] 底包未变化 (304)，使用本地缓存: {cache_path}")
+                return cache_path
+            written = stream_to_file(resp, cache_path)
+            record_bytes("bytes_in", written.size)
+            if written.changed:
+                record_bytes("bytes_out", written.size)
+            if cache:
+                cache.store(url, resp, written.sha256, written.size)
+            elapsed = (time.time() - start_time) * 1000
+            logger.info(f"✅ [Base] 下载成功 | 耗时: {elapsed:.2f}ms | 大小: {written.size / 1024:.2f}KB")
+            return cache_path
+        except Exception as e:
+            logger.error(f"❌ [Base] 下载失败: {e}")
+            return None
+
+    def load_from_file(self, path):
+        """从本地文件解析 (已下载的底包，或增量构建复用上次的产物)"""
+        parser = ConfigStreamParser(self.current_section)
+        for chunk in iter_file_chunks(path):
+            parser.feed(chunk)
+        self._apply_parsed(parser.close())
+        record_bytes("bytes_in", parser.bytes)
+        logger.info(f"📄 [Base] 解析本地文件: {path}")
+
+    def _parse(self, content):
+        parser = ConfigStreamParser(self.current_section)
+        parser.feed(content.encode('utf-8', errors='surrogatepass'))
+        self._apply_parsed(parser.close())
+
+    def _apply_parsed(self, parser):
+        """把解析结果合并进节点表"""
+        for section, lines in parser.lines.items():
+            if section not in self.sections:
+                self.sections[section] = lines
+            else:
+                self.sections[section].extend(lines)
+        self.current_section = parser.current
+        # 节点头的字节偏移和行数，便于排查底包结构
+        self.parse_index = parser.index
+
+        # 打印简要结构
+        active_secs = [k for k, v in parser.index.items() if v["lines"] > 0]
+        logger.info(f"📊 [Parse] 解析段落: {', '.join(active_secs[:5])}...")
+
+    def load_rules_from_file(self, relative_path):
+        """读取文件，返回列表 (按 mtime + 大小缓存，文件未变化时不重复读取)"""
+        abs_path = os.path.join(self.project_root, relative_path)
+
+        try:
+            st = os.stat(abs_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+
+        cached = self.rule_file_cache.get(abs_path)
+        if stamp and cached and cached[0] == stamp:
+            logger.info(f"♻️ [Local] 复用已解析文件: {relative_path} ({len(cached[1])} 条)")
+            return list(cached[1])
+
+        self.input_files[abs_path] = file_sha256(abs_path)
+
+        if stamp is None:
+            # 只有当文件不是示例文件时才警告
+            if "my_custom" not in relative_path:
+                logger.warning(f"⚠️ [Local] 文件未找到: {abs_path}")
+            return []
+
+        logger.info(f"📖 [Local] 读取文件: {relative_path}")
+        rules = []
+        try:
+            with open(abs_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                record_bytes("bytes_in", stamp[1])
+                # MITM 特殊处理
+                if "," in content and "\n" not in content and len(content) > 50:
+                    rules = [content]
+                else:
+                    for line in content.splitlines():
+                        line = line.strip()
+                        if not line or line.startswith("#") or line.startswith(";"): continue
+                        rules.append(line)
+                    logger.info(f"   └── ✅ 成功加载: {len(rules)} 条有效规则")
+
+            self.stats["files_read"] += 1
+            self.rule_file_cache[abs_path] = (stamp, rules)
+            return list(rules)
+        except Exception as e:
+            logger.error(f"❌ [Local] 读取失败: {e}")
+            return []
+
+    def include_file(self, relative_path, stack=()):
+        """
+        解析 file:// 引用并登记到引用关系图。
+        stack 为当前引用链 (规范化后的相对路径)；检测到循环时记录并返回 None。
+        """
+        rel = os.path.normpath(relative_path)
+        parent = stack[-1] if stack else "config.yaml"
+        children = self.include_graph.setdefault(parent, [])
+        if rel not in children:
+            children.append(rel)
+        self.include_refs[rel] = self.include_refs.get(rel, 0) + 1
+
+        if rel in stack:
+            cycle = list(stack[stack.index(rel):]) + [rel]
+            self.include_cycles.append(cycle)
+            logger.error(f"❌ [Local] 检测到循环引用，已跳过: {' -> '.join(cycle)}")
+            return None
+        return self.load_rules_from_file(relative_path)
+
+    def include_graph_report(self):
+        """引用关系图报告：每个文件引用了哪些文件 (fan-out)、被引用次数以及循环引用"""
+        return {
+            "graph": {parent: list(children) for parent, children in self.include_graph.items()},
+            "fan_out": {parent: len(children) for parent, children in self.include_graph.items()},
+            "references": dict(self.include_refs),
+            "cycles": [list(cycle) for cycle in self.include_cycles],
+        }
+
+    def patch_section(self, section, keywords, strategy="blacklist"):
+        if section not in self.sections: return
+        # 节点内容将被整体替换，先写回待保存的 hostname
+        self.flush_hostnames()
+        self.hostnames.pop(section, None)
+        original = self.sections[section]
+        new_lines = []
+        removed_count = 0
+
+        # 关键词只编译一次，每行单次扫描
+        matcher = KeywordMatcher(keywords)
+
+        if strategy == "blacklist":
+            for line in original:
+                if not matcher.match(line): new_lines.append(line)
+                else: removed_count += 1
+        elif strategy == "whitelist":
+            for line in original:
+                if matcher.match(line): new_lines.append(line)
+                else: removed_count += 1
+
+        self.sections[section] = new_lines
+        self.stats["rules_removed"] += removed_count
+        if removed_count > 0:
+            logger.info(f"✂️ [Patch] [{section}] 移除 {removed_count} 条规则")
+
+        hits = matcher.hit_counts()
+        self.patch_hits[section] = hits
+        dead = [k for k, v in hits.items() if v == 0]
+        if dead:
+            logger.warning(f"⚠️ [Patch] [{section}] 以下关键词未命中任何规则，可考虑从配置中移除: {', '.join(dead)}")
+
+    def _kv_positions(self, section):
+        """KV 节点的 key -> 行号 索引，节点内容被其他操作改动后自动重建"""
+        lines = self.sections[section]
+        cached = self.kv_index.get(section)
+        if cached and cached[0] is lines and cached[1] == lines.version:
+            return cached[2]
+        index = {}
+        for pos, line in enumerate(lines):
+            if "=" in line:
+                index.setdefault(line.split("=", 1)[0].strip(), []).append(pos)
+        self.kv_index[section] = (lines, lines.version, index)
+        return index
+
+    def flush_hostnames(self):
+        """
+        把合并后的 hostname 集合写回对应行 (只在有变化时重新序列化一次)。
+        行号在写回时通过 _kv_positions 重新查找：合并之后节点可能被插入、删除或整体替换过。
+        """
+        for section, hosts in self.hostnames.items():
+            if hosts.dirty and section in self.sections:
+                lines = self.sections[section]
+                positions = self._kv_positions(section).get("hostname")
+                if positions:
+                    lines[positions[0]] = f"hostname={hosts.serialize()}"
+                else:
+                    lines.append(f"hostname={hosts.serialize()}")
+                hosts.dirty = False
+
+    def set_kv(self, section, key, value):
+        if section not in self.sections: self.sections[section] = []
+        lines = self.sections[section]
+        index = self._kv_positions(section)
+        positions = index.get(key)
+
+        if not positions:
+            index[key] = [len(lines)]
+            lines.append(f"{key}={value}")
+            if key == "hostname":
+                self.hostnames[section] = HostnameSet(value)
+            logger.info(f"⚙️ [{section}] 新增: {key} = ...")
+        elif key == "hostname":
+            # 【修改】针对 hostname 特殊处理：追加而不是覆盖 (集合去重，保存时统一写回)
+            if section not in self.hostnames:
+                original_val = lines[positions[0]].split("=", 1)[1]
+                self.hostnames[section] = HostnameSet(original_val)
+            added = self.hostnames[section].add(value)
+            if added:
+                logger.info(f"🔗 [MITM] 追加 hostname: ... + {len(added)} 个")
+        else:
+            # 其他 KV 保持覆盖逻辑
+            for pos in positions:
+                lines[pos] = f"{key}={value}"
+            logger.info(f"⚙️ [{section}] 更新: {key} = ...")
+
+        self.kv_index[section] = (lines, lines.version, index)
+
+    def add_list_item(self, section, item, position="end"):
+        if section not in self.sections: self.sections[section] = []
+        if item in self.sections[section]: return
+        if position == "start": self.sections[section].prepend(item)
+        else: self.sections[section].append(item)
+        self.stats["rules_added"] += 1
+
+    def add_remote_rule(self, url, tag, policy):
+        line = f"{url}, tag={tag}, force-policy={policy}, update-interval=86400, opt-parser=true, enabled=true"
+        # 【修改】改为插入到头部 (start)，确保优先级高于底包
+        self.add_list_item("filter_remote", line, position="start")
+        self.stats["remote_refs"] += 1
+        logger.info(f"☁️ [Remote] 引用: {tag} -> {policy} (Top Priority)")
+
+    def render_section(self, section, lines):
+        """渲染单个节点，返回 (文本, 行数)；节点对象和版本号都没变时直接复用上次的结果"""
+        cached = self.render_cache.get(section)
+        if cached and cached[0] is lines and cached[1] == lines.version:
+            return cached[2], cached[3]
+
+        parts = [] if section == "header" else [f"\n[{section}]\n"]
+        parts.extend(f"{line}\n" for line in lines if line)
+        text = "".join(parts)
+        self.render_cache[section] = (lines, lines.version, text, len(parts))
+        return text, len(parts)
+
+    def render(self):
+        """把所有节点渲染成完整的配置文本，返回 (文本, 总行数)"""
+        chunks = []
+        total_lines = 0
+        for section, lines in self.sections.items():
+            if lines or section in ["general", "dns", "policy", "filter_local"]:
+                text, count = self.render_section(section, lines)
+                chunks.append(text)
+                total_lines += count
+        return "".join(chunks), total_lines
+
+    def save(self, filename):
+        logger.info(f"💾 [Save] 正在写入文件...")
+        self.flush_hostnames()
+        try:
+            start_time = time.perf_counter()
+            content, total_lines = self.render()
+            data = content.encode('utf-8')
+            render_ms = (time.perf_counter() - start_time) * 1000
+
+            # 临时文件 + 原子替换；内容哈希与现有文件一致时不写入
+            start_time = time.perf_counter()
+            written = atomic_write_bytes(filename, data)
+            if written.changed:
+                record_bytes("bytes_out", written.size)
+            write_ms = (time.perf_counter() - start_time) * 1000
+
+            size_kb = written.size / 1024
+            if written.changed:
+                logger.info(f"✅ [Save] 生成成功: {filename}")
+            else:
+                logger.info(f"✅ [Save] 内容未变化，跳过写入: {filename}")
+            logger.info(f"📊 [Stats] 大小: {size_kb:.2f}KB | 总行数: {total_lines} | 渲染: {render_ms:.2f}ms | 写入: {write_ms:.2f}ms")
+            logger.info(f"📈 [Summary] 读文件: {self.stats['files_read']} | 注入: {self.stats['rules_added']} | 删除: {self.stats['rules_removed']} | 远程: {self.stats['remote_refs']}")
+            return written
+        except Exception as e:
+            logger.error(f"❌ [Save] 保存失败: {e}")
@@ -0,0 +1,84 @@
+"""
+产物的规则级差异：把文件的有效行 (跳过空行和 # ; // 注释) 按节点分组，逐行哈希成集合，
+新旧两份集合求差即得新增 / 删除的规则，整个过程对行数是线性的。
+
+配置文件按 [section] 分组；分流列表等没有节点头的文件整份算一组 (节点名为 "")。
+比较前去掉逗号两侧的空格，只改了排版的行不算变化；重复的行只算一条。
+"""
+import hashlib
+
+# 行哈希长度 (字节)：8 字节在单个文件的规模下碰撞概率可以忽略
+DIGEST_SIZE = 8
+# 每个文件在差异报告中保留的新增 / 删除规则示例条数
+SAMPLE_SIZE = 5
+
+
+def normalize(line):
+    """比较用的规则文本：去掉首尾和逗号两侧的空格"""
+    if "," not in line:
+        return line
+    return ",".join(part.strip() for part in line.split(","))
+
+
+def line_digest(path):
+    """
+    读取文件，返回 {节点名: {行哈希: 原始行}}；文件不存在时返回空字典。
+    原始行只用于在报告中给出示例。
+    """
+    sections = {}
+    current = sections.setdefault("", {})
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(("#", ";", "//")):
+                    continue
+                if line.startswith("[") and line.endswith("]"):
+                    current = sections.setdefault(line[1:-1].strip().lower(), {})
+                    continue
+                key = hashlib.blake2b(normalize(line).encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+                current.setdefault(key, line)
+    except FileNotFoundError:
+        return {}
+    return {name: lines for name, lines in sections.items() if lines}
+
+
+def diff_digests(old, new, samples=SAMPLE_SIZE):
+    """
+    比较两份 line_digest 的结果，返回
+    {"added": n, "removed": n, "sections": {节点: {"added", "removed"}}, "samples": {"added": [...], "removed": [...]}}。
+    sections 只列出有变化的节点，整份文件只有一组 (分流列表) 时为空。
+    """
+    added = removed = 0
+    sections = {}
+    added_samples, removed_samples = [], []
+    for name in sorted(set(old) | set(new)):
+        old_lines = old.get(name, {})
+        new_lines = new.get(name, {})
+        plus = new_lines.keys() - old_lines.keys()
+        minus = old_lines.keys() - new_lines.keys()
+        if not plus and not minus:
+            continue
+        added += len(plus)
+        removed += len(minus)
+        sections[name] = {"added": len(plus), "removed": len(minus)}
+        # 按文件中的顺序取示例
+        added_samples += [line for key, line in new_lines.items() if key in plus][:samples - len(added_samples)]
+        removed_samples += [line for key, line in old_lines.items() if key in minus][:samples - len(removed_samples)]
+    if list(sections) == [""]:
+        sections = {}
+    return {
+        "added": added,
+        "removed": removed,
+        "sections": sections,
+        "samples": {"added": added_samples, "removed": removed_samples},
+    }
+
+
+def format_counts(added, removed):
+    """紧凑的增删计数，如 "+42/−7"；只有一侧时省略另一侧"""
+    if added and removed:
+        return f"+{added}/−{removed}"
+    if removed:
+        return f"−{removed}"
+    return f"+{added}"
@@ -0,0 +1,112 @@
+import re
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    多模式字符串匹配自动机：构建一次，每行只需扫描一遍，
+    与关键词数量无关 (O(行长 + 命中数))。
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        # 每个状态: 转移表 / 失配指针 / 命中的模式下标
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for idx, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(idx)
+
+        # BFS 构建失配指针，并把失配状态的输出合并进来
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find_all(self, text):
+        """返回 text 中出现过的模式下标集合"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set(output[0])
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def search(self, text):
+        """是否命中任意模式 (命中即返回)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        if output[0]:
+            return True
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class KeywordMatcher:
+    """
+    patch_section 使用的关键词匹配器。
+    普通字符串关键词编译进 Aho-Corasick 自动机；{regex: "..."} 形式的关键词按正则匹配。
+    同时统计每个关键词的命中次数，用于发现 config.yaml 中已失效的补丁。
+    """
+
+    def __init__(self, keywords):
+        self.labels = []
+        literals = []
+        self.literal_ids = []
+        self.regexes = []
+
+        for keyword in keywords or []:
+            if isinstance(keyword, dict) and "regex" in keyword:
+                pattern = str(keyword["regex"])
+                self.regexes.append((len(self.labels), re.compile(pattern)))
+                self.labels.append(f"regex:{pattern}")
+            elif keyword is not None:
+                literals.append(str(keyword))
+                self.literal_ids.append(len(self.labels))
+                self.labels.append(str(keyword))
+
+        self.automaton = AhoCorasick(literals) if literals else None
+        self.hits = [0] * len(self.labels)
+
+    def match(self, line):
+        """判断该行是否命中，并累加命中的关键词计数"""
+        matched = False
+        if self.automaton:
+            for idx in self.automaton.find_all(line):
+                self.hits[self.literal_ids[idx]] += 1
+                matched = True
+        for idx, regex in self.regexes:
+            if regex.search(line):
+                self.hits[idx] += 1
+                matched = True
+        return matched
+
+    def hit_counts(self):
+        return dict(zip(self.labels, self.hits))
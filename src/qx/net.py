@@ -0,0 +1,428 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# 与 qx.core 共用同一个 logger (避免循环导入，这里按名字获取)
+logger = logging.getLogger("QX-Core")
+
+# 单个下载任务的结果
+FetchResult = namedtuple("FetchResult", ["url", "ok", "value", "error", "elapsed"])
+
+# 写文件的结果：大小、sha256、是否真的改写了文件
+WriteResult = namedtuple("WriteResult", ["size", "sha256", "changed"])
+
+# 流式下载的分块大小
+CHUNK_SIZE = 64 * 1024
+
+# mkstemp 创建的临时文件权限为 0600，替换前改成普通文件权限 (按进程 umask)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# 按域名的超时时间 (秒)，未列出的域名使用调用方传入的默认值
+HOST_TIMEOUTS = {
+    "raw.githubusercontent.com": 15,
+    "kelee.one": 20,
+    "api.telegram.org": 10,
+}
+
+
+_jitter_retry = None
+
+
+def jitter_retry_class():
+    """
+    指数退避 + 随机抖动的 Retry，避免多个并发请求同时重试。
+    requests / urllib3 导入较慢 (几十毫秒)，第一次创建客户端时才导入，不联网的工具不加载。
+    """
+    global _jitter_retry
+    if _jitter_retry is None:
+        from urllib3.util.retry import Retry
+
+        class JitterRetry(Retry):
+            JITTER = 0.5
+
+            def get_backoff_time(self):
+                backoff = super().get_backoff_time()
+                return backoff + random.uniform(0, self.JITTER) if backoff else backoff
+
+        _jitter_retry = JitterRetry
+    return _jitter_retry
+
+
+class HttpClient:
+    """
+    整个构建共享的 HTTP 客户端：
+    连接池 + keep-alive 复用 TCP/TLS 连接，失败自动指数退避重试，按域名设置超时。
+    """
+
+    def __init__(self, pool_size=16, retries=3, backoff=0.5, timeouts=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        retry = jitter_retry_class()(
+            total=retries, connect=retries, read=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # pool_connections: 缓存的域名连接池数；pool_maxsize: 每个域名保持的连接数
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timeouts = dict(HOST_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        # 发出的请求数 (不含自动重试)，供构建报告统计
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def _count(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def timeout_for(self, url, default):
+        host = urlsplit(url).hostname or ""
+        return self.timeouts.get(host, default)
+
+    def get(self, url, timeout=15, **kwargs):
+        self._count()
+        return self.session.get(url, timeout=self.timeout_for(url, timeout), **kwargs)
+
+    def post(self, url, timeout=10, **kwargs):
+        self._count()
+        return self.session.post(url, timeout=self.timeout_for(url, timeout), **kwargs)
+
+    def connection_stats(self):
+        """统计新建连接数与复用次数 (基于 urllib3 连接池计数)"""
+        opened = requests_sent = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                requests_sent += pool.num_requests
+        return {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(0, requests_sent - opened),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取全局共享客户端 (首次使用时创建)"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def set_client(client):
+    """替换全局共享客户端 (例如按 config.yaml 的 build 参数重新创建)"""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，capacity 为允许的突发量"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时阻塞等待；返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class HostRateLimiter:
+    """按域名分桶限速，替代原先每个请求后固定 sleep(1)"""
+
+    def __init__(self, rate=1.0, burst=2):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire()
+
+
+def fetch_all(urls, worker, max_workers=4, limiter=None):
+    """
+    并发执行下载任务，返回与 urls 顺序一致的 FetchResult 列表。
+    worker(url) 返回任意值；抛出的异常会被捕获并记录到结果中。
+    同一 URL 只会执行一次。
+    """
+    unique_urls = list(dict.fromkeys(urls))
+
+    def run(url):
+        start = time.perf_counter()
+        try:
+            if limiter:
+                limiter.acquire(url)
+                start = time.perf_counter()
+            value = worker(url)
+            return FetchResult(url, True, value, None, time.perf_counter() - start)
+        except Exception as e:
+            return FetchResult(url, False, None, e, time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    workers = max(1, min(int(max_workers), len(unique_urls) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(unique_urls, pool.map(run, unique_urls)))
+    wall = time.perf_counter() - wall_start
+
+    busy = sum(r.elapsed for r in results.values())
+    if unique_urls:
+        logger.info(f"⏱️ [Fetch] {len(unique_urls)} 个请求 | 并发: {workers} | 总耗时: {wall:.2f}s | 累计请求耗时: {busy:.2f}s")
+    return [results[u] for u in urls]
+
+
+class HttpCache:
+    """
+    HTTP 条件请求缓存清单：按 URL 记录 ETag / Last-Modified / 内容哈希 / 大小。
+    下次请求时带上 If-None-Match / If-Modified-Since，服务器返回 304 即可跳过下载和写文件。
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ [Cache] 缓存清单损坏，忽略: {e}")
+            self.entries = {}
+
+    def save(self):
+        """写回清单 (先写临时文件再替换，防止中断导致清单损坏)"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            with self.lock:
+                data = dict(sorted(self.entries.items()))
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            logger.error(f"❌ [Cache] 缓存清单保存失败: {e}")
+
+    def conditional_headers(self, url, local_path):
+        """本地文件仍完好时才发条件请求，否则强制完整下载"""
+        entry = self.entries.get(url)
+        if not entry or not local_path or not os.path.exists(local_path):
+            return {}
+        if os.path.getsize(local_path) != entry.get("size"):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def store(self, url, response, sha256, size):
+        """记录一次完整下载 (200) 的缓存元数据"""
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": sha256,
+            "size": size,
+        }
+        with self.lock:
+            self.misses += 1
+            self.entries[url] = entry
+
+    def forget(self, url):
+        """丢弃链接的缓存记录，下次构建完整下载 (如内容校验失败被回滚)"""
+        with self.lock:
+            self.entries.pop(url, None)
+
+    def summary(self):
+        return {"cache_hit": self.hits, "cache_miss": self.misses}
+
+
+# 没有正文的状态码：304 只有在发送了校验头时才表示“未变化”
+NO_BODY_STATUSES = {204, 205, 304}
+
+
+def conditional_get(url, local_path, cache=None, headers=None, timeout=15, client=None, stream=False):
+    """
+    带缓存校验的 GET。
+    命中 (304) 时返回 None，调用方应直接沿用 local_path；否则返回已校验状态码的 Response。
+    local_path 为 None 表示本地没有副本，总是完整下载。
+    没有发送校验头却收到 304 (代理 / CDN 异常)，或收到 204 / 205 时响应没有正文，
+    按 HTTPError 处理，由调用方走下载失败 / 回滚的流程，避免把空内容当作新版本写入。
+    """
+    req_headers = dict(headers or {})
+    validators = cache.conditional_headers(url, local_path) if cache else {}
+    req_headers.update(validators)
+
+    client = client or get_client()
+    response = client.get(url, headers=req_headers, timeout=timeout, stream=stream)
+    if response.status_code == 304 and validators:
+        response.close()
+        cache.record_hit()
+        return None
+    response.raise_for_status()
+    if response.status_code in NO_BODY_STATUSES:
+        from requests import HTTPError
+        response.close()
+        raise HTTPError(f"{response.status_code} Unexpected status without body for url: {url}", response=response)
+    return response
+
+
+def file_sha256(path):
+    """分块计算文件哈希，文件不存在返回 None"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_temp(directory, name, chunks):
+    """把数据块写入 directory 下的临时文件，边写边算哈希，返回 (临时文件, 大小, sha256)"""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        # 中断或出错时清理临时文件，原文件保持完整
+        os.remove(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def _atomic_write_chunks(path, chunks):
+    """
+    把数据块写入同目录临时文件，完成后 os.replace 原子替换。
+    内容与现有文件一致时丢弃临时文件，不改动原文件 (也不改变 mtime)。
+    """
+    tmp_path, size, sha256 = _write_temp(os.path.dirname(path) or ".", os.path.basename(path), chunks)
+    try:
+        if os.path.exists(path) and os.path.getsize(path) == size and file_sha256(path) == sha256:
+            os.remove(tmp_path)
+            return WriteResult(size, sha256, False)
+
+        mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+        return WriteResult(size, sha256, True)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_addressed(chunks, directory, path_for):
+    """
+    内容寻址写入：先写入 directory 下的临时文件，得到哈希后移动到 path_for(sha256)。
+    目标已存在时内容必然相同，丢弃临时文件，changed 为 False。
+    """
+    tmp_path, size, sha256 = _write_temp(directory, "object", chunks)
+    try:
+        path = path_for(sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return WriteResult(size, sha256, False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+        return WriteResult(size, sha256, True)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def stream_to_file(response, path, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    流式写入响应体 (需以 stream=True 发起请求)，内存占用与文件大小无关。
+    on_chunk: 可选回调，每个数据块写入前调用一次 (如边下载边解析)。
+    """
+    chunks = response.iter_content(chunk_size=chunk_size)
+    if on_chunk:
+        chunks = _tap(chunks, on_chunk)
+    try:
+        return _atomic_write_chunks(path, chunks)
+    finally:
+        response.close()
+
+
+def _tap(chunks, callback):
+    for chunk in chunks:
+        callback(chunk)
+        yield chunk
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def atomic_write_bytes(path, data):
+    """原子写入已在内存中的数据"""
+    return _atomic_write_chunks(path, [data])
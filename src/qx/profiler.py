@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录内存峰值
+    resource = None
+
+logger = logging.getLogger("QX-Core")
+
+
+def peak_rss_kb():
+    """进程启动以来的内存峰值 (KB)；不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位是字节，Linux 是 KB
+    return peak // 1024 if os.uname().sysname == "Darwin" else peak
+
+
+class BuildProfiler:
+    """
+    构建阶段计时器：按阶段记录耗时、读入/写出字节数、HTTP 请求数、缓存命中和内存峰值，
+    最后输出 JSON 构建报告，用于跨天对比构建耗时是否退化。
+    client / cache 为 HttpClient / HttpCache，阶段结束时取计数器差值。
+    """
+
+    def __init__(self, client=None, cache=None):
+        self.client = client
+        self.cache = cache
+        self.stages = []
+        self.current = None
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.lock = threading.Lock()
+
+    def _counters(self):
+        counters = {"http_requests": self.client.request_count if self.client else 0}
+        counters["cache_hits"] = self.cache.hits if self.cache else 0
+        counters["cache_misses"] = self.cache.misses if self.cache else 0
+        return counters
+
+    @contextmanager
+    def stage(self, name):
+        record = {"stage": name, "bytes_in": 0, "bytes_out": 0}
+        before = self._counters()
+        previous, self.current = self.current, record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            for key, value in self._counters().items():
+                record[key] = value - before[key]
+            record["peak_rss_kb"] = peak_rss_kb()
+            self.current = previous
+            self.stages.append(record)
+            logger.info(f"⏱️ [Profile] {name}: {record['wall_ms']:.2f}ms | 读入: {record['bytes_in'] / 1024:.2f}KB | "
+                        f"写出: {record['bytes_out'] / 1024:.2f}KB | HTTP: {record['http_requests']}")
+
+    def add(self, key, amount):
+        """累加到当前阶段 (下载线程也会调用，需要加锁)"""
+        with self.lock:
+            if self.current is not None:
+                self.current[key] = self.current.get(key, 0) + amount
+
+    def report(self):
+        totals = {"wall_ms": round((time.perf_counter() - self.started) * 1000, 2)}
+        for key in ("bytes_in", "bytes_out", "http_requests", "cache_hits", "cache_misses"):
+            totals[key] = sum(stage.get(key, 0) for stage in self.stages)
+        totals["peak_rss_kb"] = peak_rss_kb()
+        return {"started_at": self.started_at, "totals": totals, "stages": self.stages}
+
+    def write(self, path):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            logger.info(f"📝 [Profile] 构建报告已写入: {path}")
+        except Exception as e:
+            logger.error(f"❌ [Profile] 构建报告保存失败: {e}")
+
+
+_profiler = BuildProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def set_profiler(profiler):
+    global _profiler
+    _profiler = profiler
+
+
+def record_bytes(key, amount):
+    """向当前阶段累加 bytes_in / bytes_out"""
+    _profiler.add(key, amount)
@@ -0,0 +1,211 @@
+"""
+离线分流查询：把合并后的 filter_local 和本地化的 filter_remote 列表编译成索引结构，
+回答“这个域名 / IP 会命中哪条规则、走哪个策略”。与 Quantumult X 一样按规则顺序先到先得。
+
+- HOST: 哈希表；HOST-SUFFIX: 反转标签前缀树 (DomainTrie)；
+- HOST-KEYWORD: Aho-Corasick，先用一个合并正则快速排除不含任何关键词的域名；
+- HOST-WILDCARD: 先检查通配符中最长的固定片段是否出现，再逐条匹配 (通常很少)；IP-CIDR / IP6-CIDR: 按前缀长度分桶的网段索引 (CidrIndex)。
+每种结构返回命中规则中编号最小的一条，取所有结构的最小值，都没有命中时落到 FINAL。
+
+离线查询不做 DNS 解析：域名只匹配域名类规则，IP 只匹配网段规则；
+GEOIP / IP-ASN 需要数据库，查询时忽略，命中规则之前存在这类规则时在结果中提示。
+
+用法:
+    qx query www.google.com 1.1.1.1
+    qx query --input domains.txt --output result.tsv
+"""
+import argparse
+import fnmatch
+import ipaddress
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+
+from .analyze import DEFAULT_CONFIG, RULES_DIR, collect_rules
+from .core import QXConfigManager, logger, setup_logging
+from .match import AhoCorasick
+from .rules import CIDR_TYPES, CidrIndex, DomainTrie, format_rule, parse_network
+
+# 需要 MaxMind / ASN 数据库才能判断的规则
+DATABASE_TYPES = {"geoip", "ip-asn"}
+
+Match = namedtuple("Match", ["query", "rule", "index", "note"])
+
+
+class RuleMatcher:
+    """
+    编译后的分流规则匹配器。rules 为 collect_rules 返回的有序规则列表 (已应用 force-policy)。
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.hosts = {}
+        self.suffixes = DomainTrie()
+        self.wildcards = []
+        self.cidrs = CidrIndex()
+        self.final = None
+        # 第一条 GEOIP / IP-ASN 规则的编号，IP 查询的命中规则在它之后时结果可能不准
+        self.database_index = None
+        self.skipped = Counter()
+
+        keywords, self.keyword_ids = [], []
+        for i, rule in enumerate(rules):
+            if rule.type == "host":
+                self.hosts.setdefault(rule.value, i)
+            elif rule.type == "host-suffix":
+                self.suffixes.insert(rule.value, "suffix", i)
+            elif rule.type == "host-keyword":
+                keywords.append(rule.value)
+                self.keyword_ids.append(i)
+            elif rule.type == "host-wildcard":
+                literal = max(re.split(r"[*?\[\]]", rule.value), key=len)
+                self.wildcards.append((i, literal, re.compile(fnmatch.translate(rule.value))))
+            elif rule.type in CIDR_TYPES:
+                network = parse_network(rule)
+                if network is not None:
+                    self.cidrs.insert(network, i)
+            elif rule.type == "final":
+                if self.final is None:
+                    self.final = i
+            else:
+                self.skipped[rule.type] += 1
+                if rule.type in DATABASE_TYPES and self.database_index is None:
+                    self.database_index = i
+
+        self.keywords = AhoCorasick(keywords) if keywords else None
+        self.keyword_filter = re.compile("|".join(map(re.escape, keywords))) if keywords else None
+
+    def match_domain(self, domain):
+        """域名命中的规则编号，没有命中任何域名规则时返回 None"""
+        best = self.hosts.get(domain)
+        found = self.suffixes.first_suffix_match(domain)
+        if found is not None and (best is None or found < best):
+            best = found
+        if self.keyword_filter is not None and self.keyword_filter.search(domain):
+            found = min(self.keyword_ids[k] for k in self.keywords.find_all(domain))
+            if best is None or found < best:
+                best = found
+        for i, literal, pattern in self.wildcards:
+            if best is not None and i >= best:
+                break
+            if literal in domain and pattern.match(domain):
+                best = i
+                break
+        return best
+
+    def match_ip(self, address):
+        return self.cidrs.first_containing(address)
+
+    def query(self, text):
+        """返回 Match；查询为空或无法识别时 rule 为 None"""
+        query = text.strip().lower().rstrip(".")
+        if not query:
+            return Match(text, None, None, "空查询")
+        address = None
+        # 域名的顶级域不会以数字结尾，只有疑似 IP 的查询才尝试解析 (解析失败抛异常的开销比匹配本身还大)
+        if query[-1].isdigit() or ":" in query:
+            try:
+                address = ipaddress.ip_address(query.strip("[]"))
+            except ValueError:
+                pass
+
+        index = self.match_ip(address) if address is not None else self.match_domain(query)
+        note = None
+        if address is not None and self.database_index is not None and \
+                (index is None or index > self.database_index):
+            note = f"之前有 {self.rules[self.database_index].type.upper()} 规则，离线无法判断"
+        if index is None:
+            index = self.final
+        if index is None:
+            return Match(query, None, None, note or "没有命中规则，也没有 FINAL")
+        return Match(query, self.rules[index], index, note)
+
+
+def format_match(match):
+    """制表符分隔的一行: 查询 / 策略 / 规则 / 来源:行号 [/ 提示]"""
+    if match.rule is None:
+        fields = [match.query, "", "", ""]
+    else:
+        rule = match.rule
+        fields = [match.query, rule.policy or "", format_rule(rule), f"{os.path.basename(rule.source)}:{rule.line_no}"]
+    if match.note:
+        fields.append(match.note)
+    return "\t".join(fields)
+
+
+def match_to_dict(match):
+    rule = match.rule
+    return {
+        "query": match.query,
+        "policy": rule.policy if rule else None,
+        "rule": format_rule(rule) if rule else None,
+        "source": rule.source if rule else None,
+        "line_no": rule.line_no if rule else None,
+        "index": match.index,
+        "note": match.note,
+    }
+
+
+def iter_queries(args):
+    yield from args.queries
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line and line[0] != "#":
+                    yield line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线查询域名 / IP 命中的分流规则")
+    parser.add_argument("queries", nargs="*", help="要查询的域名或 IP")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="配置文件 (默认 MyQuantumultX_Local.conf)")
+    parser.add_argument("--rules-dir", default=RULES_DIR, help="本地化规则目录")
+    parser.add_argument("--input", help="批量查询文件，每行一个域名或 IP")
+    parser.add_argument("--output", help="结果输出路径 (默认标准输出)")
+    parser.add_argument("--json", action="store_true", help="按 JSON Lines 输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    if not args.queries and not args.input:
+        logger.error("❌ [Query] 请指定要查询的域名 / IP，或用 --input 指定查询文件")
+        # 与 qx 未知子命令一致，用法错误返回 2
+        return 2
+
+    manager = QXConfigManager()
+    manager.load_from_file(args.config)
+    start = time.perf_counter()
+    matcher = RuleMatcher(collect_rules(manager, args.rules_dir))
+    logger.info(f"🧭 [Query] 编译 {len(matcher.rules)} 条规则: {(time.perf_counter() - start) * 1000:.2f}ms")
+    if matcher.skipped:
+        logger.info(f"   └── 离线忽略: {', '.join(f'{t.upper()} {n}' for t, n in matcher.skipped.most_common())}")
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    policies = Counter()
+    start = time.perf_counter()
+    try:
+        for text in iter_queries(args):
+            match = matcher.query(text)
+            policies[match.rule.policy if match.rule else None] += 1
+            out.write((json.dumps(match_to_dict(match), ensure_ascii=False) if args.json else format_match(match)) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(policies.values())
+    logger.info(f"🧭 [Query] 查询 {total} 条: {elapsed:.3f}s ({total / elapsed if elapsed else 0:.0f} 条/s)")
+    if args.output:
+        for policy, count in policies.most_common(10):
+            logger.info(f"   • {policy or '(未命中)'}: {count}")
+        logger.info(f"📝 [Query] 结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
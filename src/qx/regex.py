@@ -0,0 +1,710 @@
+"""
+重写正则分析：收集 rewrite_local 和本地化 rewrite_remote 文件中的全部重写正则，每条只编译一次，
+在合成的 URL 语料上计时，找出灾难性回溯 / 超线性的正则，以及跨文件重复或被覆盖的正则。
+
+- 计时：语料由 MITM 主机名拼出的随机 URL 和按各条正则生成的示例 URL 组成，结果为每个 URL 的平均耗时；
+- 超线性检测：按正则结构构造“前缀 + 重复单元 × n + 失败结尾”的输入，n 逐次翻倍，
+  耗时增长指数 (log2 相邻两次耗时之比) 连续两次超过阈值即判为超线性；单条正则超时 (子进程中执行，
+  超时即结束子进程) 或增长指数过大判为灾难性回溯；
+- 重复 / 覆盖：文本相同 (忽略 \\/ 与 / 的差别) 为重复；正则 A 能匹配正则 B 的全部示例 URL 时
+  认为 B 被 A 覆盖 (抽样判断，A 在前时 B 对这些 URL 不会再生效)。
+
+分析结果按正则文本缓存在 rules/regex_cache.json，正则不变时下次运行直接复用。
+Python re 与 Quantumult X 使用的正则引擎都是回溯实现，超线性的写法在两边表现一致。
+
+用法:
+    qx regex [--config MyQuantumultX_Local.conf] [--report regex_report.json]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter, namedtuple
+
+from .analyze import DEFAULT_CONFIG, RULES_DIR, parse_remote_line, remote_list_path
+from .core import QXConfigManager, logger, setup_logging
+from .match import AhoCorasick
+from .store import ContentStore
+from .validate import COMMENT_PREFIXES, REWRITE_LINE, compile_rewrite_regex, python_regex
+
+try:  # Python 3.11+
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+CACHE_FILE = os.path.join(RULES_DIR, "regex_cache.json")
+# 分析方法变化时递增，旧缓存作废
+ANALYZER_VERSION = 1
+
+# 语料中的 URL 数
+CORPUS_SIZE = 400
+# 超线性检测：重复单元的重复次数 (逐次翻倍)、结尾 (让整体匹配失败，逼出回溯)、最多尝试的重复单元数
+PUMP_SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+PUMP_TAILS = ("", "!")
+MAX_PUMPS = 6
+# 单次匹配超过该耗时 (秒) 不再加大输入
+GROWTH_BUDGET = 0.05
+# 耗时低于该值 (秒) 时计时噪声太大，不判断增长
+MIN_SIGNAL = 0.0005
+# 增长指数阈值：1 为线性，2 为平方；超过 CATASTROPHIC_EXPONENT 视为灾难性回溯
+SUPERLINEAR_EXPONENT = 1.5
+CATASTROPHIC_EXPONENT = 4.0
+MAX_EXPONENT = 10.0
+# 单条正则的分析超时 (秒)，超时视为灾难性回溯
+PATTERN_TIMEOUT = 3.0
+# 覆盖判断时每条正则生成的示例数
+SAMPLES_PER_PATTERN = 12
+
+# 示例字符的候选 (覆盖字母、数字和 URL 常见符号)
+CANDIDATE_CHARS = "a0Z/._-%=&?:"
+URL_WORDS = ("api", "v1", "v2", "ad", "ads", "config", "home", "feed", "static", "img", "splash", "user", "index")
+
+LITERAL = sre_constants.LITERAL
+NOT_LITERAL = sre_constants.NOT_LITERAL
+ANY = sre_constants.ANY
+IN = sre_constants.IN
+CATEGORY = sre_constants.CATEGORY
+BRANCH = sre_constants.BRANCH
+SUBPATTERN = sre_constants.SUBPATTERN
+NEGATE = sre_constants.NEGATE
+RANGE = sre_constants.RANGE
+MAXREPEAT = sre_constants.MAXREPEAT
+REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, "POSSESSIVE_REPEAT", None)} - {None}
+ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+ZERO_WIDTH = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+
+Rewrite = namedtuple("Rewrite", ["pattern", "action", "source", "line_no"])
+
+
+# === 收集重写规则 ===
+
+def _hostnames(value):
+    value = value.strip()
+    for marker in ("%APPEND%", "%INSERT%"):
+        value = value.replace(marker, "")
+    return [h.strip() for h in value.split(",") if h.strip()]
+
+
+def scan_rewrites(lines, source, rewrites, hostnames):
+    """提取重写行和 hostname 行 (与 Quantumult X 一样忽略 .js 等文件中的脚本代码)"""
+    for line_no, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith(COMMENT_PREFIXES):
+            continue
+        if line.replace(" ", "").lower().startswith("hostname="):
+            hostnames.extend(_hostnames(line.split("=", 1)[1]))
+            continue
+        match = REWRITE_LINE.match(line)
+        if match:
+            rewrites.append(Rewrite(match.group(1), match.group(2), source, line_no))
+
+
+def collect_rewrites(manager, rules_dir=RULES_DIR, store=None):
+    """
+    按配置顺序收集重写规则：先 rewrite_local，再按 rewrite_remote 的顺序读取本地化文件。
+    返回 (重写规则列表, MITM 主机名列表)。
+    """
+    rewrites, hostnames = [], []
+    scan_rewrites(manager.sections.get("rewrite_local", []), "rewrite_local", rewrites, hostnames)
+    scan_rewrites(manager.sections.get("mitm", []), "mitm", rewrites, hostnames)
+
+    store = store or ContentStore(rules_dir)
+    for line in manager.sections.get("rewrite_remote", []):
+        url, options = parse_remote_line(line)
+        if not url or options.get("enabled", "true").lower() == "false":
+            continue
+        path = remote_list_path(url, rules_dir, store, "rewrite_remote")
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ [Regex] 未找到本地化文件，跳过: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            scan_rewrites(f.read().splitlines(), path, rewrites, hostnames)
+    return rewrites, hostnames
+
+
+# === 按正则结构生成字符串 ===
+
+def parse_pattern(pattern):
+    """解析为 sre 语法树；无法编译时抛出 re.error"""
+    return sre_parse.parse(*python_regex(pattern))
+
+
+def _in_category(category, ch):
+    name = category.name.lower()
+    if "digit" in name:
+        hit = ch.isdigit()
+    elif "word" in name:
+        hit = ch.isalnum() or ch == "_"
+    elif "space" in name:
+        hit = ch.isspace()
+    else:
+        hit = ch == "\n"
+    return not hit if "_not_" in name else hit
+
+
+def _in_set(items, ch):
+    code = ord(ch)
+    hit = negate = False
+    for op, av in items:
+        if op == NEGATE:
+            negate = True
+        elif op == LITERAL:
+            hit = hit or code == av
+        elif op == RANGE:
+            hit = hit or av[0] <= code <= av[1]
+        elif op == CATEGORY:
+            hit = hit or _in_category(av, ch)
+    return hit != negate
+
+
+def _sample_char(op, av, rng):
+    if op == LITERAL:
+        return chr(av)
+    if op == NOT_LITERAL:
+        return "a" if av != ord("a") else "b"
+    if op == ANY:
+        return rng.choice("abc")
+    if op == IN:
+        choices = [ch for ch in CANDIDATE_CHARS if _in_set(av, ch)]
+        if choices:
+            return rng.choice(choices)
+        literals = [a for o, a in av if o == LITERAL]
+        return chr(literals[0]) if literals else "a"
+    choices = [ch for ch in CANDIDATE_CHARS if _in_category(av, ch)]
+    return rng.choice(choices) if choices else "a"
+
+
+class _Stop(Exception):
+    pass
+
+
+def _emit(items, rng, out, prefix_only=False):
+    """
+    按语法树生成字符串写入 out。prefix_only 时只生成开头确定的部分 (可选项取最少次数、分支取第一个)，
+    遇到不确定的字符或可变长度的重复时停止。
+    """
+    for op, av in items:
+        if op == LITERAL:
+            out.append(chr(av))
+        elif op in (NOT_LITERAL, ANY, IN, CATEGORY):
+            if prefix_only:
+                raise _Stop
+            out.append(_sample_char(op, av, rng))
+        elif op == BRANCH:
+            alternatives = av[1]
+            _emit(alternatives[0] if prefix_only else rng.choice(alternatives), rng, out, prefix_only)
+        elif op == SUBPATTERN:
+            _emit(av[-1], rng, out, prefix_only)
+        elif op == ATOMIC_GROUP:
+            _emit(av, rng, out, prefix_only)
+        elif op in REPEATS:
+            low, high, item = av
+            if prefix_only:
+                for _ in range(low):
+                    _emit(item, rng, out, prefix_only)
+                if high != low and high > 1:
+                    raise _Stop
+                continue
+            count = low if rng.random() < 0.3 else rng.randint(low, min(high, low + 3))
+            for _ in range(count):
+                _emit(item, rng, out, prefix_only)
+        elif op in ZERO_WIDTH:
+            continue
+        elif prefix_only:
+            raise _Stop
+
+
+def literal_prefix(parsed):
+    """一个能匹配的确定开头 (分支取第一个)，超线性检测时放在重复单元之前"""
+    out = []
+    try:
+        _emit(parsed, None, out, prefix_only=True)
+    except _Stop:
+        pass
+    return "".join(out)
+
+
+def required_literal(parsed):
+    """任何匹配都必然包含的最长固定片段 (只看顶层和分组中的连续字符)"""
+    best, run = "", []
+
+    def walk(items):
+        nonlocal best
+        for op, av in items:
+            if op == LITERAL:
+                run.append(chr(av))
+                continue
+            if op == SUBPATTERN:
+                walk(av[-1])
+                continue
+            if op in ZERO_WIDTH:
+                continue
+            if len(run) > len(best):
+                best = "".join(run)
+            run.clear()
+
+    walk(parsed)
+    if len(run) > len(best):
+        best = "".join(run)
+    return best
+
+
+def sample_strings(regex, parsed, count, rng):
+    """生成能被正则匹配的示例字符串 (生成后再用正则验证，去掉不匹配的)"""
+    samples = []
+    for _ in range(count):
+        out = []
+        _emit(parsed, rng, out)
+        text = "".join(out)
+        if regex.search(text) and text not in samples:
+            samples.append(text)
+    return samples
+
+
+def pump_units(parsed, rng):
+    """超线性检测的重复单元：可无限重复的部分各生成一个示例，再加上正则里的固定片段和通用字符"""
+    units = []
+
+    def walk(items):
+        run = []
+        for op, av in items:
+            if op == LITERAL:
+                run.append(chr(av))
+                continue
+            if len(run) >= 2:
+                units.append("".join(run))
+            run = []
+            if op == BRANCH:
+                for alternative in av[1]:
+                    walk(alternative)
+            elif op == SUBPATTERN:
+                walk(av[-1])
+            elif op == ATOMIC_GROUP:
+                walk(av)
+            elif op in REPEATS:
+                low, high, item = av
+                if high == MAXREPEAT or high >= 16:
+                    out = []
+                    _emit(item, rng, out)
+                    units.insert(0, "".join(out))
+                walk(item)
+        if len(run) >= 2:
+            units.append("".join(run))
+
+    walk(parsed)
+    units.extend(("a", "/"))
+    return [u for u in dict.fromkeys(units) if u][:MAX_PUMPS]
+
+
+# === 计时与超线性检测 ===
+
+def _time_search(regex, text):
+    """单次匹配耗时 (秒)；很快时取三次最小值减少噪声"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        regex.search(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > 0.001:
+            break
+    return best
+
+
+def time_corpus(regex, corpus, repeat=3):
+    """语料上每个 URL 的平均匹配耗时 (微秒)"""
+    search = regex.search
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in corpus:
+            search(url)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(corpus) * 1e6 if corpus else 0.0
+
+
+def growth_exponent(times):
+    """
+    由翻倍输入的耗时序列估计增长指数：取最后两次翻倍中较小的 log2 比值 (1 为线性，2 为平方)。
+    第一个输入就超出预算时返回 MAX_EXPONENT；耗时太短无法判断时返回 0。
+    """
+    if times[-1] > GROWTH_BUDGET and len(times) == 1:
+        return MAX_EXPONENT
+    if times[-1] < MIN_SIGNAL or len(times) < 2:
+        return 0.0
+    ratios = [b / a for a, b in zip(times, times[1:]) if a > 0]
+    if not ratios:
+        return 0.0
+    # 超出预算提前结束时只有最后一次翻倍可信
+    recent = ratios[-1:] if times[-1] > GROWTH_BUDGET else ratios[-2:]
+    return round(min(MAX_EXPONENT, max(0.0, math.log2(min(recent)))), 2)
+
+
+def probe_growth(regex, parsed, rng):
+    """对每个重复单元构造翻倍输入，返回增长最快的一组 {exponent, pump, tail, n, times_ms}"""
+    prefix = literal_prefix(parsed)
+    worst = {"exponent": 0.0}
+    for pump in pump_units(parsed, rng):
+        for tail in PUMP_TAILS:
+            times = []
+            for n in PUMP_SIZES:
+                times.append(_time_search(regex, prefix + pump * n + tail))
+                if times[-1] > GROWTH_BUDGET:
+                    break
+            exponent = growth_exponent(times)
+            if exponent > worst["exponent"]:
+                worst = {
+                    "exponent": exponent,
+                    "pump": pump,
+                    "tail": tail,
+                    "n": PUMP_SIZES[len(times) - 1],
+                    "times_ms": [round(t * 1000, 3) for t in times],
+                }
+        if worst["exponent"] >= CATASTROPHIC_EXPONENT:
+            break
+    return worst
+
+
+def verdict_of(exponent):
+    if exponent >= CATASTROPHIC_EXPONENT:
+        return "catastrophic"
+    if exponent >= SUPERLINEAR_EXPONENT:
+        return "superlinear"
+    return "ok"
+
+
+def analyze_pattern(pattern, corpus):
+    """分析一条正则：编译耗时、语料平均耗时、增长指数和结论 (ok / superlinear / catastrophic / error)"""
+    start = time.perf_counter()
+    try:
+        regex = compile_rewrite_regex(pattern)
+        parsed = parse_pattern(pattern)
+    except re.error as e:
+        return {"verdict": "error", "error": str(e)}
+    compile_us = (time.perf_counter() - start) * 1e6
+    rng = random.Random(pattern)
+    growth = probe_growth(regex, parsed, rng)
+    return {
+        "verdict": verdict_of(growth["exponent"]),
+        "compile_us": round(compile_us, 1),
+        "corpus_us": round(time_corpus(regex, corpus), 3),
+        **growth,
+    }
+
+
+def _sandbox_worker(conn, patterns, corpus):
+    for pattern in patterns:
+        conn.send(("start", pattern))
+        conn.send(("done", pattern, analyze_pattern(pattern, corpus)))
+    conn.send(("end",))
+    conn.close()
+
+
+def analyze_patterns(patterns, corpus, timeout=PATTERN_TIMEOUT):
+    """
+    在子进程中逐条分析 (灾难性回溯无法中断，只能结束进程)：
+    某条正则超时后结束子进程，记为 catastrophic，再启动新进程分析剩下的正则。
+    """
+    import multiprocessing
+
+    results = {}
+    pending = list(patterns)
+    while pending:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_sandbox_worker, args=(sender, pending, corpus), daemon=True)
+        process.start()
+        sender.close()
+        current, timed_out = None, False
+        try:
+            while True:
+                if not receiver.poll(timeout):
+                    timed_out = True
+                    break
+                message = receiver.recv()
+                if message[0] == "start":
+                    current = message[1]
+                elif message[0] == "done":
+                    results[message[1]] = message[2]
+                    current = None
+                else:
+                    break
+        except EOFError:
+            pass
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
+
+        if current is not None:
+            results[current] = {"verdict": "catastrophic", "exponent": MAX_EXPONENT, "timeout": True} if timed_out \
+                else {"verdict": "error", "error": "分析进程异常退出"}
+        elif timed_out or any(p not in results for p in pending):
+            # 子进程在两条正则之间退出，剩下的不再重试
+            for pattern in pending:
+                results.setdefault(pattern, {"verdict": "error", "error": "分析进程异常退出"})
+        pending = [p for p in pending if p not in results]
+    return results
+
+
+# === 语料 ===
+
+def build_corpus(rewrites, hostnames, size=CORPUS_SIZE, seed=0):
+    """合成 URL 语料：一半是 MITM 主机名上的随机路径，一半是按各条正则生成的示例 URL"""
+    rng = random.Random(seed)
+    hosts = sorted({h.lstrip("-").replace("*", "www") for h in hostnames}) or ["www.example.com"]
+    corpus = []
+    for _ in range(size // 2):
+        path = "/".join(rng.choice(URL_WORDS) for _ in range(rng.randint(1, 4)))
+        query = "&".join(f"{rng.choice(URL_WORDS)}={rng.randrange(10 ** 6)}" for _ in range(rng.randint(0, 3)))
+        corpus.append(f"https://{rng.choice(hosts)}/{path}" + (f"?{query}" if query else ""))
+
+    patterns = list(dict.fromkeys(r.pattern for r in rewrites))
+    rng.shuffle(patterns)
+    for pattern in patterns:
+        if len(corpus) >= size:
+            break
+        try:
+            corpus.extend(sample_strings(compile_rewrite_regex(pattern), parse_pattern(pattern), 1, rng))
+        except re.error:
+            continue
+    return corpus
+
+
+# === 重复 / 覆盖 ===
+
+def _normalize(pattern):
+    return pattern.replace("\\/", "/")
+
+
+def _location(rewrite):
+    return f"{os.path.basename(rewrite.source)}:{rewrite.line_no}"
+
+
+def _overlap(kind, rewrite, cover):
+    return {
+        "kind": kind,
+        "pattern": rewrite.pattern,
+        "action": rewrite.action,
+        "source": _location(rewrite),
+        "covered_by": cover.pattern,
+        "covered_by_action": cover.action,
+        "covered_by_source": _location(cover),
+        "same_action": rewrite.action == cover.action,
+    }
+
+
+def find_overlaps(rewrites, samples_per_pattern=SAMPLES_PER_PATTERN):
+    """
+    找出重复和被覆盖的重写正则。
+    - duplicate: 与更早的正则文本相同；
+    - subsumed: 示例 URL 全部能被更早的另一条正则匹配；
+    - covered_by_later: 示例 URL 全部能被之后更宽的正则匹配 (顺序调换后才会失效，仅供参考)。
+    覆盖用抽样判断：先用 Aho-Corasick 按“必然包含的固定片段”筛出候选，再逐条验证示例。
+    """
+    findings = []
+    first = {}
+    entries = []
+    for order, rewrite in enumerate(rewrites):
+        key = _normalize(rewrite.pattern)
+        if key in first:
+            findings.append(_overlap("duplicate", rewrite, rewrites[first[key]]))
+            continue
+        first[key] = order
+        try:
+            regex = compile_rewrite_regex(rewrite.pattern)
+            parsed = parse_pattern(rewrite.pattern)
+        except re.error:
+            continue
+        samples = sample_strings(regex, parsed, samples_per_pattern, random.Random(rewrite.pattern))
+        entries.append((order, rewrite, regex, required_literal(parsed).lower(), samples))
+
+    # 忽略大小写的正则也能被筛出来：固定片段和示例都转小写，候选再用原正则验证
+    automaton = AhoCorasick([literal for _, _, _, literal, _ in entries])
+    for order, rewrite, _, _, samples in entries:
+        if not samples:
+            continue
+        candidates = automaton.find_all(samples[0].lower())
+        covers = []
+        for k in sorted(candidates):
+            other_order, other, regex, _, _ = entries[k]
+            if other_order != order and all(regex.search(s) for s in samples):
+                covers.append((other_order, other))
+        if not covers:
+            continue
+        earlier = [c for c in covers if c[0] < order]
+        if earlier:
+            findings.append(_overlap("subsumed", rewrite, earlier[0][1]))
+        else:
+            findings.append(_overlap("covered_by_later", rewrite, covers[0][1]))
+    return findings
+
+
+# === 缓存 ===
+
+class RegexCache:
+    """分析结果缓存：按正则文本的哈希记录，保存时只保留本次用到的正则"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == ANALYZER_VERSION:
+                    self.entries = data.get("patterns", {})
+            except Exception as e:
+                logger.warning(f"⚠️ [Regex] 分析缓存损坏，忽略: {e}")
+
+    @staticmethod
+    def key(pattern):
+        return hashlib.sha256(pattern.encode("utf-8")).hexdigest()[:20]
+
+    def get(self, pattern):
+        key = self.key(pattern)
+        entry = self.entries.get(key)
+        if entry is None or entry.get("pattern") != pattern:
+            self.misses += 1
+            return None
+        self.used.add(key)
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, pattern, result):
+        key = self.key(pattern)
+        self.entries[key] = {"pattern": pattern, "result": result}
+        self.used.add(key)
+
+    def save(self):
+        data = {
+            "version": ANALYZER_VERSION,
+            "patterns": {k: self.entries[k] for k in sorted(self.used) if k in self.entries},
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ [Regex] 分析缓存保存失败: {e}")
+
+
+# === 汇总 ===
+
+def audit_rewrites(manager, rules_dir=RULES_DIR, cache=None, store=None, timeout=PATTERN_TIMEOUT):
+    """分析配置引用的全部重写正则，返回报告字典 (缓存中没有的正则才在子进程中计时)"""
+    rewrites, hostnames = collect_rewrites(manager, rules_dir, store)
+    patterns = list(dict.fromkeys(r.pattern for r in rewrites))
+
+    results, missing = {}, []
+    for pattern in patterns:
+        cached = cache.get(pattern) if cache else None
+        if cached is None:
+            missing.append(pattern)
+        else:
+            results[pattern] = cached
+    start = time.perf_counter()
+    if missing:
+        corpus = build_corpus(rewrites, hostnames)
+        for pattern, result in analyze_patterns(missing, corpus, timeout).items():
+            results[pattern] = result
+            if cache is not None:
+                cache.put(pattern, result)
+    elapsed = time.perf_counter() - start
+    overlaps = find_overlaps(rewrites)
+
+    first_use = {}
+    for rewrite in rewrites:
+        first_use.setdefault(rewrite.pattern, rewrite)
+    patterns_report = [
+        {"pattern": p, "action": first_use[p].action, "source": _location(first_use[p]), **results[p]}
+        for p in patterns
+    ]
+    verdicts = Counter(entry["verdict"] for entry in patterns_report)
+    kinds = Counter(f["kind"] for f in overlaps)
+    return {
+        "summary": {
+            "rewrites": len(rewrites),
+            "patterns": len(patterns),
+            "analyzed": len(missing),
+            "cached": len(patterns) - len(missing),
+            "analyze_seconds": round(elapsed, 3),
+            "verdicts": dict(verdicts),
+            "overlaps": dict(kinds),
+        },
+        "patterns": patterns_report,
+        "overlaps": overlaps,
+    }
+
+
+def log_audit(name, report, limit=10):
+    summary = report["summary"]
+    verdicts = summary["verdicts"]
+    overlaps = summary["overlaps"]
+    logger.info(f"🧮 [Regex] {name}: 重写 {summary['rewrites']} 条 | 正则 {summary['patterns']} 个 "
+                f"(新分析 {summary['analyzed']}, 缓存 {summary['cached']}, {summary['analyze_seconds']:.2f}s)")
+    logger.info(f"   └── 灾难性回溯: {verdicts.get('catastrophic', 0)} | 超线性: {verdicts.get('superlinear', 0)} | "
+                f"无法编译: {verdicts.get('error', 0)} | 重复: {overlaps.get('duplicate', 0)} | "
+                f"被覆盖: {overlaps.get('subsumed', 0)}")
+    flagged = [p for p in report["patterns"] if p["verdict"] in ("catastrophic", "superlinear")]
+    flagged.sort(key=lambda p: -p.get("exponent", 0))
+    for p in flagged[:limit]:
+        detail = "超时" if p.get("timeout") else f"n^{p['exponent']:.1f}, 重复单元 {p.get('pump', '')!r}"
+        logger.warning(f"   ⚠️ [{p['verdict']}] {p['pattern'][:100]} ({p['source']}, {detail})")
+    for p in [p for p in report["patterns"] if p["verdict"] == "error"][:limit]:
+        logger.warning(f"   ⚠️ [error] {p['pattern'][:100]} ({p['source']}): {p['error']}")
+    return flagged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="重写正则性能与重复分析")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="要分析的配置文件 (默认 MyQuantumultX_Local.conf)")
+    parser.add_argument("--rules-dir", default=RULES_DIR, help="本地化规则目录")
+    parser.add_argument("--cache", default=CACHE_FILE, help="分析缓存路径 (默认 rules/regex_cache.json)")
+    parser.add_argument("--no-cache", action="store_true", help="忽略缓存，重新分析全部正则")
+    parser.add_argument("--timeout", type=float, default=PATTERN_TIMEOUT, help="单条正则的分析超时 (秒)")
+    parser.add_argument("--top", type=int, default=10, help="列出语料上最慢的正则数")
+    parser.add_argument("--report", help="输出 JSON 报告路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    manager = QXConfigManager()
+    manager.load_from_file(args.config)
+
+    cache = None if args.no_cache else RegexCache(args.cache)
+    report = audit_rewrites(manager, args.rules_dir, cache, timeout=args.timeout)
+    if cache is not None:
+        cache.save()
+    log_audit(os.path.basename(args.config), report)
+
+    slowest = sorted((p for p in report["patterns"] if "corpus_us" in p), key=lambda p: -p["corpus_us"])
+    if slowest:
+        logger.info(f"🐢 [Regex] 语料上最慢的 {min(args.top, len(slowest))} 个正则 (每个 URL 平均耗时):")
+        for p in slowest[:args.top]:
+            logger.info(f"   • {p['corpus_us']:.2f}µs {p['pattern'][:100]} ({p['source']})")
+    for f in report["overlaps"][:20]:
+        logger.info(f"   • [{f['kind']}] {f['pattern'][:80]} ({f['source']}) <- {f['covered_by'][:80]} ({f['covered_by_source']})")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"config": args.config, **report}, f, ensure_ascii=False, indent=2)
+        logger.info(f"📝 [Regex] 报告已写入: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import ipaddress
+import os
+import re
+from collections import namedtuple
+
+# 一条分流规则: 类型(已规范化小写) / 值 / 策略 / 额外参数 / 来源文件 / 行号
+Rule = namedtuple("Rule", ["type", "value", "policy", "options", "source", "line_no"])
+
+# 其他客户端的规则类型写法 -> Quantumult X 写法
+TYPE_ALIASES = {
+    "domain": "host",
+    "domain-suffix": "host-suffix",
+    "domain-keyword": "host-keyword",
+    "domain-wildcard": "host-wildcard",
+    "ip-cidr6": "ip6-cidr",
+    "ip6-cidr": "ip6-cidr",
+    "ipv6-cidr": "ip6-cidr",
+}
+
+DOMAIN_TYPES = {"host", "host-suffix", "host-keyword", "host-wildcard"}
+CIDR_TYPES = {"ip-cidr", "ip6-cidr"}
+# 不带值、只有策略的规则
+VALUELESS_TYPES = {"final"}
+# Quantumult X 支持的全部分流规则类型
+RULE_TYPES = DOMAIN_TYPES | CIDR_TYPES | VALUELESS_TYPES | {"geoip", "ip-asn", "user-agent"}
+
+
+def normalize_type(rule_type):
+    rule_type = rule_type.strip().lower()
+    return TYPE_ALIASES.get(rule_type, rule_type)
+
+
+def parse_rule(line, source=None, line_no=0):
+    """
+    解析一行分流规则，注释/空行/无法识别的行返回 None。
+    支持行尾 // 注释 (如 ASN.China.list 的 "IP-ASN,4134 // 中国电信")。
+    """
+    line = line.strip()
+    if not line or line[0] in "#;":
+        return None
+    if "//" in line:
+        line = line.split("//", 1)[0].strip()
+    fields = [f.strip() for f in line.split(",")]
+    if len(fields) < 2 or not fields[0]:
+        return None
+
+    rule_type = normalize_type(fields[0])
+    if rule_type in VALUELESS_TYPES:
+        return Rule(rule_type, "", fields[1], tuple(fields[2:]), source, line_no)
+
+    value = fields[1]
+    if rule_type in DOMAIN_TYPES:
+        value = value.lower().rstrip(".")
+    policy = fields[2] if len(fields) > 2 else None
+    return Rule(rule_type, value, policy, tuple(fields[3:]), source, line_no)
+
+
+def format_rule(rule, policy=None):
+    """把规则序列化回 Quantumult X 格式"""
+    policy = policy or rule.policy
+    if rule.type in VALUELESS_TYPES:
+        parts = [rule.type, policy]
+    else:
+        parts = [rule.type, rule.value] + ([policy] if policy else [])
+    return ",".join(parts + list(rule.options))
+
+
+def load_rule_file(path):
+    """读取规则列表文件 (不存在返回空列表)"""
+    if not os.path.exists(path):
+        return []
+    rules = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f, 1):
+            rule = parse_rule(line, path, line_no)
+            if rule:
+                rules.append(rule)
+    return rules
+
+
+def parse_network(rule):
+    """IP-CIDR / IP6-CIDR 规则 -> ip_network，格式错误返回 None"""
+    try:
+        return ipaddress.ip_network(rule.value, strict=False)
+    except ValueError:
+        return None
+
+
+def is_no_resolve(rule):
+    """规则带 no-resolve 参数：请求为域名时不解析，直接跳过该规则"""
+    return any(option.lower() == "no-resolve" for option in rule.options)
+
+
+def cidr_covers(earlier, later):
+    """
+    网段包含 later 的 earlier 规则是否能挡住 later 的全部请求：
+    earlier 带 no-resolve 而 later 不带时，域名请求会跳过 earlier、由 later 解析后命中，不算覆盖。
+    """
+    return not is_no_resolve(earlier) or is_no_resolve(later)
+
+
+class DomainTrie:
+    """
+    按反转域名标签组织的前缀树 (com -> apple -> www)。
+    每个节点记录以该域名为值的 HOST / HOST-SUFFIX 规则编号，
+    查询某个域名的所有“后缀覆盖者”只需沿标签走一遍。
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    @staticmethod
+    def labels(domain):
+        return reversed(domain.split("."))
+
+    def insert(self, domain, kind, item):
+        """kind: "host" 或 "suffix"；item 为任意载荷 (通常是规则编号)"""
+        node = self.root
+        for label in self.labels(domain):
+            node = node.setdefault(label, {})
+        node.setdefault(("", kind), []).append(item)
+
+    def suffix_matches(self, domain):
+        """返回所有覆盖 domain 的 HOST-SUFFIX 载荷 (从顶级域开始，包含 domain 自身)"""
+        found = []
+        node = self.root
+        for label in self.labels(domain):
+            node = node.get(label)
+            if node is None:
+                break
+            found.extend(node.get(("", "suffix"), ()))
+        return found
+
+    def first_suffix_match(self, domain):
+        """覆盖 domain 的 HOST-SUFFIX 载荷中最小的一个 (载荷为规则编号时即最先出现的规则)，没有返回 None"""
+        best = None
+        node = self.root
+        for label in self.labels(domain):
+            node = node.get(label)
+            if node is None:
+                break
+            items = node.get(("", "suffix"))
+            if items and (best is None or items[0] < best):
+                best = items[0]
+        return best
+
+    def host_matches(self, domain):
+        """返回值恰好为 domain 的 HOST 载荷"""
+        node = self.root
+        for label in self.labels(domain):
+            node = node.get(label)
+            if node is None:
+                return []
+        return list(node.get(("", "host"), ()))
+
+
+class CidrIndex:
+    """
+    IP 段索引：按 (地址族, 前缀长度) 分桶的哈希表，
+    查询某个网段被哪些已登记网段包含只需检查 0..prefixlen 共 33/129 个桶。
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        # 每个地址族实际出现过的前缀长度，逐个查询时跳过空桶
+        self.prefixlens = {}
+
+    def insert(self, network, item):
+        key = (network.version, network.prefixlen)
+        self.buckets.setdefault(key, {}).setdefault(int(network.network_address), []).append(item)
+        lengths = self.prefixlens.setdefault(network.version, [])
+        if network.prefixlen not in lengths:
+            lengths.append(network.prefixlen)
+            lengths.sort()
+
+    def containing(self, network):
+        """返回所有包含 network 的载荷 (包含相同网段)"""
+        found = []
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        for prefixlen in range(network.prefixlen + 1):
+            bucket = self.buckets.get((network.version, prefixlen))
+            if not bucket:
+                continue
+            shift = bits - prefixlen
+            found.extend(bucket.get((address >> shift) << shift, ()))
+        return found
+
+    def first_containing(self, address):
+        """包含单个地址 (ip_address) 的载荷中最小的一个，没有返回 None"""
+        best = None
+        value = int(address)
+        bits = address.max_prefixlen
+        for prefixlen in self.prefixlens.get(address.version, ()):
+            shift = bits - prefixlen
+            items = self.buckets[(address.version, prefixlen)].get((value >> shift) << shift)
+            if items and (best is None or items[0] < best):
+                best = items[0]
+        return best
+
+
+class PolicyMapper:
+    """
+    policy_map 策略名映射 (如 us-node -> 美国节点)，所有映射编译成一个交替正则。
+    - 分流规则只替换策略字段 (final 为第 2 个字段，其余为第 3 个字段)，不会误改域名等其他字段；
+    - 其他节点 (policy、server_local 等) 替换任意一个逗号分隔的完整字段。
+    map_rules 把整批规则拼接后只做一次正则替换。
+    """
+
+    def __init__(self, mapping=None):
+        self.mapping = {str(k): str(v) for k, v in (mapping or {}).items() if k is not None and v is not None}
+        self.policy_re = None
+        self.token_re = None
+        if self.mapping:
+            # 长的名字优先，避免 "proxy" 抢先匹配 "proxy-us"
+            alternation = "|".join(re.escape(k) for k in sorted(self.mapping, key=len, reverse=True))
+            end = r"(?=[ \t]*(?:,|$))"
+            self.policy_re = re.compile(
+                r"^([ \t]*(?:(?i:final)[ \t]*|(?!(?i:final)[ \t]*,)[^,\n]*,[^,\n]*),[ \t]*)"
+                rf"({alternation}){end}",
+                re.M,
+            )
+            self.token_re = re.compile(rf"(,[ \t]*)({alternation}){end}", re.M)
+
+    def __bool__(self):
+        return bool(self.mapping)
+
+    def get(self, policy, default=None):
+        return self.mapping.get(policy, default)
+
+    def _replace(self, match):
+        return match.group(1) + self.mapping[match.group(2)]
+
+    def map_rule(self, rule, policy_only=True):
+        if not self.mapping:
+            return rule
+        regex = self.policy_re if policy_only else self.token_re
+        return regex.sub(self._replace, rule)
+
+    def map_rules(self, rules, policy_only=True):
+        """批量映射，返回新列表 (规则中不能包含换行)"""
+        rules = list(rules)
+        if not self.mapping or not rules:
+            return rules
+        regex = self.policy_re if policy_only else self.token_re
+        return regex.sub(self._replace, "\n".join(rules)).split("\n")
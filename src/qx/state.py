@@ -0,0 +1,265 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from .diff import diff_digests, line_digest
+from .net import file_sha256
+
+logger = logging.getLogger("QX-Core")
+
+# 引用的本地文件不存在时记录的指纹 (之后文件出现也能触发重建)
+MISSING = "missing"
+
+
+def builder_fingerprint(src_dir):
+    """构建器自身代码的哈希：代码变化后所有缓存的阶段结果都应失效"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(src_dir, "*.py"))):
+        digest.update(os.path.basename(path).encode())
+        digest.update((file_sha256(path) or "").encode())
+    return digest.hexdigest()
+
+
+class BuildState:
+    """
+    增量构建清单：记录上次构建每个输入的指纹 (配置、file:// 文件、底包内容、构建器代码)
+    以及产物哈希。输入和产物都没变时可以跳过对应阶段。
+    name: 多配置构建时的配置名，用于日志和报告中区分各配置的阶段
+    """
+
+    def __init__(self, manifest_path, project_root, name=None):
+        self.manifest_path = manifest_path
+        self.project_root = project_root
+        self.name = name
+        self.previous = {}
+        self.current = {}
+        # (阶段, 是否跳过, 原因)
+        self.report = []
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    self.previous = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ [Incremental] 构建清单损坏，执行完整构建: {e}")
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.project_root)
+
+    def changed_input_file(self):
+        """返回上次构建读取过、但内容已变化的第一个 file:// 文件；全部未变化返回 None"""
+        for rel_path, sha in self.previous.get("input_files", {}).items():
+            if (file_sha256(os.path.join(self.project_root, rel_path)) or MISSING) != sha:
+                return rel_path
+        return None
+
+    def change_reason(self, stage, fingerprint, outputs):
+        """
+        对比指纹和产物，返回需要重新执行的原因；全部一致返回 None。
+        fingerprint: {名称: 哈希}；outputs: 该阶段的产物路径列表
+        """
+        prev_stage = self.previous.get("stages", {}).get(stage)
+        if not prev_stage:
+            return "没有上次构建记录"
+        for name, value in fingerprint.items():
+            if prev_stage.get("inputs", {}).get(name) != value:
+                return f"输入变化: {name}"
+        if stage == "compose":
+            changed_file = self.changed_input_file()
+            if changed_file:
+                return f"本地文件变化: {changed_file}"
+        prev_outputs = self.previous.get("outputs", {})
+        for path in outputs:
+            rel = self._rel(path)
+            if rel not in prev_outputs or file_sha256(path) != prev_outputs[rel]:
+                return f"产物缺失或被修改: {rel}"
+        return None
+
+    def should_skip(self, stage, fingerprint, outputs, force=False):
+        """判断阶段是否可以跳过，并记录报告"""
+        reason = "--force 强制完整构建" if force else self.change_reason(stage, fingerprint, outputs)
+        skipped = reason is None
+        label = f"{self.name}/{stage}" if self.name else stage
+        self.report.append((label, skipped, reason or "输入和产物均未变化"))
+        if skipped:
+            logger.info(f"⏭️ [Incremental] 跳过阶段 [{label}]: 输入和产物均未变化")
+        else:
+            logger.info(f"🔁 [Incremental] 执行阶段 [{label}]: {reason}")
+        return skipped
+
+    def record(self, stage, fingerprint, extra=None):
+        stage_state = {"inputs": dict(fingerprint)}
+        if extra:
+            stage_state.update(extra)
+        self.current.setdefault("stages", {})[stage] = stage_state
+
+    def previous_stage(self, stage):
+        return self.previous.get("stages", {}).get(stage, {})
+
+    def record_input_files(self, input_files):
+        self.current["input_files"] = {
+            self._rel(path): sha or MISSING for path, sha in sorted(input_files.items())
+        }
+
+    def record_outputs(self, paths):
+        outputs = self.current.setdefault("outputs", {})
+        for path in paths:
+            if os.path.exists(path):
+                outputs[self._rel(path)] = file_sha256(path)
+
+    def save(self):
+        # 被跳过的阶段沿用上次记录
+        for key in ("stages", "outputs"):
+            merged = dict(self.previous.get(key, {}))
+            merged.update(self.current.get(key, {}))
+            self.current[key] = merged
+        self.current.setdefault("input_files", self.previous.get("input_files", {}))
+        tmp_path = f"{self.manifest_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.current, f, ensure_ascii=False, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            logger.error(f"❌ [Incremental] 构建清单保存失败: {e}")
+
+    def summary(self):
+        return [f"{stage}: {'跳过' if skipped else '执行'} ({reason})" for stage, skipped, reason in self.report]
+
+
+def count_rules(path):
+    """统计文件中的有效行 (跳过空行和 # ; // 注释)"""
+    count = 0
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith(("#", ";", "//")):
+                count += 1
+    return count
+
+
+class ArtifactManifest:
+    """
+    产物内容清单：记录构建写出的每个文件 (配置、本地化规则) 的 sha256 / 大小 / 有效行数。
+    写文件时即可判断内容是否变化，不再依赖 git status；变化列表以结构化数据提供给通知。
+    内容变化时还会比较新旧内容的规则集合，给出每个文件 (配置按节点) 新增 / 删除的规则数。
+    """
+
+    def __init__(self, manifest_path, project_root):
+        self.manifest_path = manifest_path
+        self.project_root = project_root
+        self.entries = {}
+        self.changed = {}
+        # 就地覆盖的文件 (配置) 写入前的规则集合，登记写入时与新内容比较
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ [Artifacts] 产物清单损坏，忽略: {e}")
+        # 上次构建的记录，用于撤销本次的登记
+        self.loaded = dict(self.entries)
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.project_root)
+
+    def snapshot(self, path):
+        """记录 path 被覆盖前的规则集合 (文件不存在时不记录)；用于写入后无法再取得旧内容的文件"""
+        if os.path.exists(path):
+            lines = line_digest(path)
+            with self.lock:
+                self.snapshots[self._rel(path)] = lines
+
+    def record(self, path, result, previous=None):
+        """
+        登记一次写入 (result 为 WriteResult)。
+        文件内容没变时只补全清单；变化时返回变化记录 (路径、新旧哈希、大小和行数差值)，
+        清单里没有旧记录时 old_sha256 为 None。
+        previous: 旧内容所在的文件 (如下载前的对象)，没有时使用 snapshot 记录的规则集合；
+        能取得旧内容 (或文件是新增的) 时，变化记录还带有 added / removed / sections / samples。
+        """
+        rel = self._rel(path)
+        with self.lock:
+            old = self.entries.get(rel)
+            old_lines = self.snapshots.pop(rel, None)
+        if not result.changed and old and old.get("sha256") == result.sha256:
+            return None
+
+        rules = count_rules(path) if os.path.exists(path) else 0
+        entry = {"sha256": result.sha256, "size": result.size, "rules": rules}
+        change = None
+        if result.changed:
+            old = old or {}
+            change = {
+                "path": rel,
+                "old_sha256": old.get("sha256"),
+                "new_sha256": result.sha256,
+                "size_delta": result.size - old.get("size", 0),
+                "rules_delta": rules - old.get("rules", 0),
+            }
+            if old_lines is None and previous and os.path.exists(previous):
+                old_lines = line_digest(previous)
+            if old_lines is None and change["old_sha256"] is None:
+                old_lines = {}
+            if old_lines is not None:
+                change.update(diff_digests(old_lines, line_digest(path)))
+        with self.lock:
+            self.entries[rel] = entry
+            if change:
+                self.changed[rel] = change
+        return change
+
+    def revert(self, path):
+        """
+        撤销本次构建对 path 的登记 (如校验失败的文件被回滚)：
+        文件仍存在时恢复为上次构建的记录，文件已删除时移除记录。
+        """
+        rel = self._rel(path)
+        with self.lock:
+            self.changed.pop(rel, None)
+            if os.path.exists(path) and rel in self.loaded:
+                self.entries[rel] = self.loaded[rel]
+            else:
+                self.entries.pop(rel, None)
+
+    def changes(self):
+        """本次构建内容发生变化的产物 (按路径排序)"""
+        with self.lock:
+            return [self.changed[rel] for rel in sorted(self.changed)]
+
+    def write_changes(self, path):
+        """
+        把本次构建的变化写成 JSON 报告 (每个文件的新旧哈希、规则增删数、按节点的计数和示例)，
+        供 CI 上传为构建产物；没有变化时也会写出，便于按天对比。
+        """
+        changes = self.changes()
+        report = {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "files": len(changes),
+            "added": sum(c.get("added", 0) for c in changes),
+            "removed": sum(c.get("removed", 0) for c in changes),
+            "changes": changes,
+        }
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+        except Exception as e:
+            logger.error(f"❌ [Artifacts] 变化报告保存失败: {e}")
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        try:
+            with self.lock:
+                data = dict(sorted(self.entries.items()))
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            logger.error(f"❌ [Artifacts] 产物清单保存失败: {e}")
@@ -0,0 +1,255 @@
+"""
+本地化规则的内容寻址存储：
+- rules/objects/<sha256 前两位>/<sha256><扩展名>：按内容哈希命名，内容相同的文件只存一份，写入后不再改动；
+- rules/objects/index.json：链接 -> {sha256, size, ext, alias}；
+- rules/<节点>/<文件名>：对象内容的可读副本 (普通文件)。旧版配置和其他设备仍引用这些路径，
+  raw.githubusercontent.com 对符号链接只返回目标路径文本，因此别名不用符号链接。
+  不同链接的文件名相同时，后出现的链接加上链接哈希后缀，分配结果记在索引里，之后保持不变。
+
+配置中引用对象路径，因此内容不变时输出的链接也不变；镜像链接内容相同时引用同一个对象。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .net import CHUNK_SIZE, WriteResult, atomic_write_bytes, file_sha256, write_addressed
+
+logger = logging.getLogger("QX-Core")
+
+OBJECTS_DIR = "objects"
+
+
+class ContentStore:
+
+    def __init__(self, rules_dir):
+        self.rules_dir = rules_dir
+        self.objects_dir = os.path.join(rules_dir, OBJECTS_DIR)
+        self.index_path = os.path.join(self.objects_dir, "index.json")
+        self.index = {}
+        # 本次构建用到的链接 (之外的索引条目在保存时清理) 和派生对象 (如精简后的列表)
+        self.seen = set()
+        self.pinned = set()
+        # 本次构建写入的派生内容别名 (如 xxx.min.list)，保存时保留
+        self.derived = set()
+        # 本次构建下载前链接指向的对象，新内容校验失败时回滚
+        self.previous = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ [Store] 对象索引损坏，重新下载全部规则: {e}")
+
+    @staticmethod
+    def relpath(sha256, ext):
+        """对象相对 rules/ 的路径，也是输出链接中仓库前缀之后的部分"""
+        return f"{OBJECTS_DIR}/{sha256[:2]}/{sha256}{ext}"
+
+    def path(self, relpath):
+        return os.path.join(self.rules_dir, *relpath.split("/"))
+
+    def alias_for(self, url, section, file_name):
+        """
+        登记链接并返回其别名 (如 filter_remote/General.conf)。
+        已分配过的沿用；文件名已被其他链接占用时加上链接哈希后缀。
+        """
+        with self.lock:
+            self.seen.add(url)
+            entry = self.index.setdefault(url, {})
+            alias = entry.get("alias")
+            if alias and alias.startswith(f"{section}/"):
+                return alias
+            alias = f"{section}/{file_name}"
+            if any(e.get("alias") == alias for u, e in self.index.items() if u != url):
+                stem, ext = os.path.splitext(file_name)
+                alias = f"{section}/{stem}-{hashlib.sha256(url.encode()).hexdigest()[:8]}{ext}"
+            entry["alias"] = alias
+            return alias
+
+    def object_of(self, url):
+        """链接当前对应的对象相对路径；还没有下载过时返回 None"""
+        with self.lock:
+            entry = self.index.get(url) or {}
+        if not entry.get("sha256"):
+            return None
+        return self.relpath(entry["sha256"], entry.get("ext", ""))
+
+    def local_path(self, url):
+        """链接对应的本地对象文件 (用于条件请求)；不存在时返回 None"""
+        relpath = self.object_of(url)
+        if relpath and os.path.exists(self.path(relpath)):
+            return self.path(relpath)
+        return None
+
+    def entry_for_object(self, relpath):
+        """按对象路径反查索引条目 (镜像链接共用对象时返回第一个)"""
+        with self.lock:
+            for entry in self.index.values():
+                if entry.get("sha256") and self.relpath(entry["sha256"], entry.get("ext", "")) == relpath:
+                    return dict(entry)
+        return None
+
+    def put_response(self, url, response):
+        """流式写入下载内容，更新索引并指向别名；changed 表示该链接的内容是否变化"""
+        with self.lock:
+            alias = self.index[url]["alias"]
+        ext = os.path.splitext(alias)[1]
+        try:
+            written = write_addressed(response.iter_content(chunk_size=CHUNK_SIZE), self.objects_dir,
+                                      lambda sha256: self.path(self.relpath(sha256, ext)))
+        finally:
+            response.close()
+        with self.lock:
+            entry = self.index[url]
+            if entry.get("sha256") and url not in self.previous:
+                self.previous[url] = {k: entry[k] for k in ("sha256", "size", "ext") if k in entry}
+            entry.update({"sha256": written.sha256, "size": written.size, "ext": ext})
+        changed = self.link(alias, self.relpath(written.sha256, ext))
+        return WriteResult(written.size, written.sha256, changed)
+
+    def touch(self, url):
+        """上游未变化 (304)：确认别名仍指向现有对象"""
+        relpath = self.object_of(url)
+        with self.lock:
+            entry = dict(self.index[url])
+        self.link(entry["alias"], relpath)
+        return WriteResult(entry["size"], entry["sha256"], False)
+
+    def previous_object(self, url):
+        """本次下载前链接指向的对象相对路径 (对象仍存在时)；没有时返回 None"""
+        with self.lock:
+            entry = self.previous.get(url)
+        if not entry or entry["sha256"] == (self.index.get(url) or {}).get("sha256"):
+            return None
+        relpath = self.relpath(entry["sha256"], entry.get("ext", ""))
+        return relpath if os.path.exists(self.path(relpath)) else None
+
+    def rollback(self, url):
+        """链接和别名恢复为下载前的对象，返回 WriteResult；没有可恢复的对象时返回 None"""
+        relpath = self.previous_object(url)
+        if relpath is None:
+            return None
+        with self.lock:
+            entry = self.index[url]
+            entry.update(self.previous.pop(url))
+            alias = entry["alias"]
+        self.link(alias, relpath)
+        return WriteResult(entry["size"], entry["sha256"], False)
+
+    def discard(self, url):
+        """
+        放弃链接当前的对象 (内容无效且无法回滚)：删除别名，配置继续引用原始链接；
+        对象不再被引用，保存时清理。
+        """
+        with self.lock:
+            entry = self.index.get(url) or {}
+            for key in ("sha256", "size", "ext"):
+                entry.pop(key, None)
+            alias = entry.get("alias")
+        if alias and os.path.lexists(self.path(alias)):
+            os.remove(self.path(alias))
+
+    @staticmethod
+    def _validation_key(entry, opt_parser):
+        return f"{entry['sha256']}+opt-parser" if opt_parser else entry["sha256"]
+
+    def is_validated(self, url, opt_parser=False):
+        """链接当前的对象是否已经通过校验 (对象内容不可变，只需校验一次)"""
+        with self.lock:
+            entry = self.index.get(url) or {}
+            return bool(entry.get("sha256")) and entry.get("validated") == self._validation_key(entry, opt_parser)
+
+    def mark_validated(self, url, opt_parser=False):
+        with self.lock:
+            entry = self.index[url]
+            entry["validated"] = self._validation_key(entry, opt_parser)
+
+    def put_bytes(self, data, alias):
+        """写入派生内容 (如精简后的列表)，返回 (对象相对路径, WriteResult)"""
+        ext = os.path.splitext(alias)[1]
+        written = write_addressed([data], self.objects_dir, lambda sha256: self.path(self.relpath(sha256, ext)))
+        relpath = self.relpath(written.sha256, ext)
+        with self.lock:
+            self.pinned.add(relpath)
+            self.derived.add(alias)
+        changed = self.link(alias, relpath)
+        return relpath, WriteResult(written.size, written.sha256, changed)
+
+    def link(self, alias, relpath):
+        """让别名的内容与对象一致 (复制为普通文件)，返回别名是否有变化"""
+        alias_path = self.path(alias)
+        object_path = self.path(relpath)
+        sha256 = os.path.basename(relpath)[:64]
+        if os.path.islink(alias_path):
+            # 旧版本生成的符号链接别名换成普通文件
+            os.remove(alias_path)
+        elif os.path.isfile(alias_path) and os.path.getsize(alias_path) == os.path.getsize(object_path) \
+                and file_sha256(alias_path) == sha256:
+            return False
+        os.makedirs(os.path.dirname(alias_path), exist_ok=True)
+        with open(object_path, 'rb') as f:
+            atomic_write_bytes(alias_path, f.read())
+        return True
+
+    def save(self):
+        """
+        写回索引并清理：删除本次构建没有用到的链接、不再被引用的对象和失效的别名。
+        """
+        with self.lock:
+            stale = [url for url in self.index if url not in self.seen]
+            for url in stale:
+                alias = self.index.pop(url).get("alias")
+                if alias and os.path.lexists(self.path(alias)) and \
+                        not any(e.get("alias") == alias for e in self.index.values()):
+                    os.remove(self.path(alias))
+            referenced = {self.relpath(e["sha256"], e.get("ext", "")) for e in self.index.values() if e.get("sha256")}
+            referenced |= self.pinned
+            aliases = {e["alias"] for e in self.index.values() if e.get("alias")} | self.derived
+            data = dict(sorted(self.index.items()))
+
+        removed = 0
+        # 对象存储中出现过的全部内容哈希 (含本次清理的)，用于识别由构建器生成的别名副本
+        known = set()
+        for shard in sorted(os.listdir(self.objects_dir)) if os.path.isdir(self.objects_dir) else []:
+            shard_dir = os.path.join(self.objects_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                known.add(name[:64])
+                if f"{OBJECTS_DIR}/{shard}/{name}" not in referenced:
+                    os.remove(os.path.join(shard_dir, name))
+                    removed += 1
+            if not os.listdir(shard_dir):
+                os.rmdir(shard_dir)
+        self._remove_unused_aliases(aliases, known)
+
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.error(f"❌ [Store] 对象索引保存失败: {e}")
+        logger.info(f"🗃️ [Store] 链接: {len(data)} | 对象: {len(referenced)} | 清理链接: {len(stale)} | 清理对象: {removed}")
+
+    def _remove_unused_aliases(self, aliases, known):
+        """
+        删除别名目录中不再使用的别名 (如关闭精简后留下的 .min 别名)。
+        只删除内容是某个对象副本的文件 (由构建器生成)，用户自己放入的文件不动。
+        """
+        for section in sorted({alias.split("/", 1)[0] for alias in aliases}):
+            section_dir = os.path.join(self.rules_dir, section)
+            if section == OBJECTS_DIR or not os.path.isdir(section_dir):
+                continue
+            for name in os.listdir(section_dir):
+                if f"{section}/{name}" not in aliases and not name.endswith(".tmp"):
+                    alias_path = os.path.join(section_dir, name)
+                    # 旧版本留下的符号链接别名在对象清理后失效，一并删除
+                    dangling = os.path.islink(alias_path) and not os.path.exists(alias_path)
+                    if dangling or (os.path.isfile(alias_path) and file_sha256(alias_path) in known):
+                        os.remove(alias_path)
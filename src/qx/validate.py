@@ -0,0 +1,335 @@
+"""
+产物校验：第二次保存前检查本地化的远程文件和输出配置，避免把错误页、空文件或无法解析的格式推送到所有设备。
+
+- filter_remote 列表：逐行按分流规则语法解析；开启 opt-parser 时允许 Clash YAML 列表等资源解析器能转换的写法；
+- rewrite_remote 文件：提取重写行检查正则能否编译、重写类型是否已知 (.js 等文件中的脚本代码与 Quantumult X 一样忽略)；
+- 输出配置：策略组定义、filter_local 规则语法、规则和 force-policy 引用的策略是否存在、rewrite_local 正则。
+
+空文件、二进制、HTML 页面、没有任何可识别内容的文件视为无效；个别无法识别的行只记为警告。
+正则按 Python re 编译，与 Quantumult X 的正则引擎大体一致 ((?<name>...) 等写法会先转换)。
+
+用法:
+    qx validate --config MyQuantumultX_Local.conf rules/filter_remote/* rules/rewrite_remote/*
+"""
+import argparse
+import functools
+import os
+import re
+import sys
+
+from .analyze import parse_remote_line
+from .core import QXConfigManager, logger, setup_logging
+from .rules import CIDR_TYPES, RULE_TYPES, normalize_type, parse_network, parse_rule
+
+FILTER = "filter_remote"
+REWRITE = "rewrite_remote"
+
+BUILTIN_POLICIES = {"direct", "proxy", "reject", "reject-200", "reject-img", "reject-dict",
+                    "reject-array", "reject-video", "reject-no-drop"}
+POLICY_TYPES = {"static", "available", "round-robin", "url-latency-benchmark", "dest-hash", "ssid"}
+REWRITE_ACTIONS = {
+    "reject", "reject-200", "reject-img", "reject-dict", "reject-array", "reject-video",
+    "302", "307", "request-header", "request-body", "response-header", "response-body", "echo-response",
+    "script-request-header", "script-request-body", "script-response-header", "script-response-body",
+    "script-echo-response", "script-analyze-echo-response",
+}
+# 请求 / 响应改写的各种变体 (request-body-json-add / response-header-replace-regex / jsonjq-response-body 等)
+ACTION_PREFIXES = ("request-header-", "request-body-", "response-header-", "response-body-", "jsonjq-")
+
+REWRITE_LINE = re.compile(r"^(\S+)\s+url\s+(\S+)")
+# Loon 插件 / Surge 模块的节点名，需要资源解析器转换
+MODULE_SECTION = re.compile(r"^\[(rewrite|url rewrite|script|mitm|map local|header rewrite|body rewrite|rule)\]$", re.I)
+IPV4_OCTET = r"(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+IPV4_CIDR = re.compile(rf"^{IPV4_OCTET}(\.{IPV4_OCTET}){{3}}/(3[0-2]|[12]?\d)$")
+HTML_PREFIXES = ("<!doctype", "<html", "<head", "<body", "<?xml")
+COMMENT_PREFIXES = ("#", ";", "//")
+
+# 未开启 opt-parser 时，无法识别的行超过该比例视为整个文件无效
+INVALID_RATIO = 0.5
+# 每个文件最多记录的问题行
+MAX_ISSUES = 20
+
+
+def _warn(report, line_no, message):
+    report["warning_count"] += 1
+    if len(report["warnings"]) < MAX_ISSUES:
+        report["warnings"].append(f"L{line_no}: {message}" if line_no else message)
+
+
+def read_text(path):
+    """读取待校验的文件，返回 (文本, 错误原因)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.strip():
+        return None, "空文件"
+    if b"\0" in data[:4096]:
+        return None, "二进制文件"
+    text = data.decode("utf-8", errors="replace")
+    if text.lstrip("\ufeff \t\r\n")[:16].lower().startswith(HTML_PREFIXES):
+        return None, "HTML 页面 (可能是错误页或登录页)"
+    return text, None
+
+
+def python_regex(pattern):
+    """
+    Quantumult X 重写正则转为 Python re 写法，返回 (正则, flags)：
+    (?<name>...) 改写为 (?P<name>...)，非开头的 (?i) 改为整体忽略大小写。
+    """
+    pattern = re.sub(r"\(\?<(?=[A-Za-z_])", "(?P<", pattern)
+    if "(?i)" in pattern and not pattern.startswith("(?i)"):
+        return pattern.replace("(?i)", ""), re.IGNORECASE
+    return pattern, 0
+
+
+@functools.lru_cache(maxsize=8192)
+def compile_rewrite_regex(pattern):
+    """按 Python re 编译重写正则 (按正则文本缓存，同一条正则在校验和分析中只编译一次)"""
+    return re.compile(*python_regex(pattern))
+
+
+def check_rewrite(pattern, action):
+    """检查一条重写规则，返回问题描述或 None"""
+    try:
+        compile_rewrite_regex(pattern)
+    except re.error as e:
+        return f"正则无法编译 ({e}): {pattern[:80]}"
+    if action not in REWRITE_ACTIONS and not action.startswith(ACTION_PREFIXES):
+        return f"未知的重写类型: {action}"
+    return None
+
+
+def check_filter_line(line):
+    """检查一行分流规则，返回问题描述或 None (只看类型和值，比 parse_rule 轻，大列表逐行校验用)"""
+    if "//" in line:
+        line = line.split("//", 1)[0]
+    rule_type, sep, rest = line.partition(",")
+    rule_type = normalize_type(rule_type)
+    value = rest.split(",", 1)[0].strip()
+    if not sep or rule_type not in RULE_TYPES or not value:
+        return f"无法识别的规则: {line[:80]}"
+    if rule_type in CIDR_TYPES and not IPV4_CIDR.match(value):
+        if parse_network(parse_rule(line)) is None:
+            return f"IP 段格式错误: {value}"
+    return None
+
+
+def check_filter_lines(lines, opt_parser, report):
+    valid = invalid = 0
+    for line_no, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith(COMMENT_PREFIXES):
+            continue
+        if opt_parser:
+            # 资源解析器能转换 Clash rule-provider (payload: / - DOMAIN-SUFFIX,xxx)
+            if line == "payload:":
+                continue
+            line = line.lstrip("-").strip().strip("'\"")
+        problem = check_filter_line(line)
+        if problem is None:
+            valid += 1
+            continue
+        invalid += 1
+        # 开启 opt-parser 时无法识别的类型由资源解析器丢弃，不逐行提示
+        if not opt_parser or problem.startswith("IP"):
+            _warn(report, line_no, problem)
+
+    report["checked"] = valid
+    if not valid:
+        report["errors"].append("没有可识别的分流规则")
+    elif not opt_parser and invalid > (valid + invalid) * INVALID_RATIO:
+        report["errors"].append(f"{invalid}/{valid + invalid} 行无法识别")
+
+
+def check_rewrite_lines(lines, opt_parser, report):
+    rewrites = hostnames = bad = 0
+    module = False
+    for line_no, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith(COMMENT_PREFIXES):
+            continue
+        if line.replace(" ", "").lower().startswith("hostname="):
+            hostnames += 1
+            continue
+        if MODULE_SECTION.match(line):
+            module = True
+            continue
+        match = REWRITE_LINE.match(line)
+        if not match:
+            continue
+        rewrites += 1
+        problem = check_rewrite(match.group(1), match.group(2))
+        if problem:
+            _warn(report, line_no, problem)
+            if problem.startswith("正则"):
+                bad += 1
+
+    report["checked"] = rewrites
+    # 只有 hostname 的文件 (如单独的 MITM 片段) 是有效的；模块格式的 hostname 同样需要转换
+    if not rewrites and (module or not hostnames):
+        if module and opt_parser:
+            _warn(report, None, "Loon / Surge 模块格式，依赖资源解析器转换")
+        elif module:
+            report["errors"].append("Loon / Surge 模块格式，但没有开启 opt-parser")
+        else:
+            report["errors"].append("没有可识别的重写规则")
+    elif rewrites and bad == rewrites:
+        report["errors"].append("所有重写正则都无法编译")
+
+
+def validate_file(path, kind, opt_parser=False):
+    """
+    校验一个本地化文件，kind 为 filter_remote / rewrite_remote。
+    返回报告字典：valid / errors (文件级问题) / warnings (前 MAX_ISSUES 条行级问题) / checked (有效规则数)。
+    """
+    report = {"path": path, "kind": kind, "valid": False, "errors": [], "warnings": [],
+              "warning_count": 0, "checked": 0}
+    try:
+        text, problem = read_text(path)
+    except OSError as e:
+        text, problem = None, f"无法读取: {e}"
+    if problem:
+        report["errors"].append(problem)
+        return report
+
+    lines = text.splitlines()
+    if kind == FILTER:
+        check_filter_lines(lines, opt_parser, report)
+    else:
+        check_rewrite_lines(lines, opt_parser, report)
+    report["valid"] = not report["errors"]
+    return report
+
+
+def validate_files(jobs, max_workers=None):
+    """
+    并行校验多个文件，jobs 为 (路径, 类型, 是否开启 opt-parser) 列表，返回对应的报告列表。
+    只有一个文件或只有一个进程可用时在当前进程执行。
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [validate_file(*job) for job in jobs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(validate_file, *zip(*jobs), chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def policy_names(manager):
+    """配置中可以被规则引用的策略：内置策略、[policy] 中定义的策略组和服务器标签"""
+    names = set()
+    for line in manager.sections.get("policy", []):
+        if "=" in line and not line.lstrip().startswith(COMMENT_PREFIXES):
+            names.add(line.split("=", 1)[1].split(",", 1)[0].strip())
+    for sec in ("server_local", "server_remote"):
+        for line in manager.sections.get(sec, []):
+            match = re.search(r"tag\s*=\s*([^,]+)", line)
+            if match:
+                names.add(match.group(1).strip())
+    return names
+
+
+def validate_config(manager):
+    """校验输出配置的各个节点，返回 (节点, 行号, 问题描述) 列表"""
+    issues = []
+    policies = policy_names(manager)
+
+    def defined(policy):
+        return policy.lower() in BUILTIN_POLICIES or policy in policies
+
+    seen = set()
+    for line_no, line in enumerate(manager.sections.get("policy", []), 1):
+        line = line.strip()
+        if not line or line.startswith(COMMENT_PREFIXES):
+            continue
+        policy_type, _, rest = line.partition("=")
+        name = rest.split(",", 1)[0].strip()
+        if policy_type.strip().lower() not in POLICY_TYPES or not name:
+            issues.append(("policy", line_no, f"无法识别的策略组: {line[:80]}"))
+        elif name in seen:
+            issues.append(("policy", line_no, f"策略组重复定义: {name}"))
+        seen.add(name)
+
+    for line_no, line in enumerate(manager.sections.get("filter_local", []), 1):
+        if not line.strip() or line.strip().startswith(COMMENT_PREFIXES):
+            continue
+        rule = parse_rule(line)
+        if rule is None or rule.type not in RULE_TYPES:
+            issues.append(("filter_local", line_no, f"无法识别的规则: {line.strip()[:80]}"))
+        elif not rule.policy or not defined(rule.policy):
+            issues.append(("filter_local", line_no, f"策略不存在: {rule.policy} ({line.strip()[:80]})"))
+
+    for sec in ("filter_remote", "rewrite_remote", "server_remote"):
+        for line_no, line in enumerate(manager.sections.get(sec, []), 1):
+            if not line.strip() or line.strip().startswith(COMMENT_PREFIXES):
+                continue
+            url, options = parse_remote_line(line)
+            if not url:
+                issues.append((sec, line_no, f"缺少资源链接: {line.strip()[:80]}"))
+            elif sec == "filter_remote" and options.get("force-policy") and not defined(options["force-policy"]):
+                issues.append((sec, line_no, f"force-policy 策略不存在: {options['force-policy']}"))
+
+    for line_no, line in enumerate(manager.sections.get("rewrite_local", []), 1):
+        line = line.strip()
+        if not line or line.startswith(COMMENT_PREFIXES) or line.replace(" ", "").lower().startswith("hostname="):
+            continue
+        match = REWRITE_LINE.match(line)
+        problem = check_rewrite(match.group(1), match.group(2)) if match else f"无法识别的重写规则: {line[:80]}"
+        if problem:
+            issues.append(("rewrite_local", line_no, problem))
+    return issues
+
+
+def log_file_report(report, name=None):
+    """name 为日志中显示的文件名 (默认取路径中的文件名，对象文件可传入别名)"""
+    name = name or os.path.basename(report["path"])
+    if report["errors"]:
+        logger.error(f"  ❌ [Validate] {name}: {'; '.join(report['errors'])}")
+    elif report["warning_count"]:
+        logger.warning(f"  ⚠️ [Validate] {name}: {report['warning_count']} 行有问题")
+    for warning in report["warnings"][:5]:
+        logger.info(f"     • {warning}")
+
+
+def log_config_issues(name, issues):
+    if not issues:
+        logger.info(f"🧪 [Validate] {name}: 输出配置校验通过")
+        return
+    logger.warning(f"⚠️ [Validate] {name}: 输出配置有 {len(issues)} 个问题")
+    for sec, line_no, message in issues[:MAX_ISSUES]:
+        logger.warning(f"   • [{sec}] 第 {line_no} 行: {message}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="校验本地化规则文件和输出配置")
+    parser.add_argument("paths", nargs="*", help="本地化文件 (按所在目录 filter_remote / rewrite_remote 判断类型)")
+    parser.add_argument("--config", help="要校验的配置文件")
+    parser.add_argument("--opt-parser", action="store_true", help="按开启资源解析器 (opt-parser) 的规则校验")
+    parser.add_argument("--workers", type=int, default=None, help="校验进程数 (默认为 CPU 核数)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    failed = 0
+    if args.config:
+        manager = QXConfigManager()
+        manager.load_from_file(args.config)
+        issues = validate_config(manager)
+        log_config_issues(os.path.basename(args.config), issues)
+        failed += bool(issues)
+
+    jobs = []
+    for path in args.paths:
+        kind = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        jobs.append((path, REWRITE if kind == REWRITE else FILTER, args.opt_parser))
+    reports = validate_files(jobs, args.workers)
+    for report in reports:
+        log_file_report(report)
+    invalid = sum(not r["valid"] for r in reports)
+    if reports:
+        logger.info(f"🧪 [Validate] 文件: {len(reports)} | 无效: {invalid}")
+    sys.exit(1 if failed or invalid else 0)
+
+
+if __name__ == "__main__":
+    main()